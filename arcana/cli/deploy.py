@@ -9,8 +9,6 @@ from traceback import format_exc
 import tempfile
 import yaml
 import click
-import docker
-import docker.errors
 import xnat as xnatpy
 from arcana.core.cli import cli
 from arcana.core.pipeline import Input as PipelineInput, Output as PipelineOutput
@@ -21,6 +19,7 @@ from arcana.core.deploy.utils import (
     DOCKER_HUB,
     extract_file_from_docker_image,
     compare_specs,
+    docker_client,
 )
 from arcana.core.deploy.docs import create_doc
 from arcana.core.deploy.build import SPEC_PATH as spec_path_in_docker
@@ -169,6 +168,17 @@ DOCKER_ORG is the Docker organisation the images should belong to"""
         "Remove built images after they are pushed to the registry (requires --push)"
     ),
 )
+@click.option(
+    "--cache-from",
+    type=str,
+    multiple=True,
+    default=(),
+    help=(
+        "Image (e.g. a previous build pushed to the registry) to pull and use as a "
+        "layer-cache source when building the images. Can be specified multiple "
+        "times"
+    ),
+)
 def build(
     spec_path,
     docker_org,
@@ -188,6 +198,7 @@ def build(
     check_registry,
     push,
     clean_up,
+    cache_from,
 ):
 
     if clean_up and not push:
@@ -214,7 +225,7 @@ def build(
     else:
         install_extras = []
 
-    dc = docker.from_env()
+    dc = docker_client()
 
     logging.basicConfig(filename=logfile, level=getattr(logging, loglevel.upper()))
 
@@ -311,6 +322,7 @@ def build(
                 build_dir=image_build_dir,
                 generate_only=generate_only,
                 license_dir=license_dir,
+                cache_from=cache_from,
                 **spec,
             )
         except Exception:
@@ -541,7 +553,7 @@ def inspect_docker_exec(image_tag):
     entrypoint/cmd
 
     IMAGE_TAG is the tag of the Docker image to inspect"""
-    dc = docker.from_env()
+    dc = docker_client()
 
     dc.images.pull(image_tag)
 
@@ -1,4 +1,5 @@
 import sys
+import subprocess
 import os
 import shutil
 import traceback
@@ -10,7 +11,7 @@ from functools import reduce
 from operator import mul
 import tempfile
 from pathlib import Path
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 import pytest
 import docker
 import xnat
@@ -86,6 +87,54 @@ def test_deploy_build_cli(command_spec, cli_runner, work_dir):
     dc.images.remove(tag)
 
 
+def test_deploy_build_cli_cache_from(command_spec, cli_runner, work_dir):
+
+    build_dir = work_dir / "build"
+    build_dir.mkdir()
+    spec_path = work_dir / "test-specs"
+    spec_path.mkdir()
+    with open(spec_path / "concatenate.yml", "w") as f:
+        yaml.dump(
+            {
+                "commands": [command_spec],
+                "pkg_version": "1.0",
+                "authors": [{"name": "Some One", "email": "some.one@an.email.org"}],
+                "info_url": "http://concatenate.readthefakedocs.io",
+            },
+            f,
+        )
+
+    cache_images = ["testorg/concatenate:0.9", "testorg/concatenate:0.8"]
+
+    # Mock the Docker client so the build arguments can be inspected without
+    # needing a Docker daemon
+    dc = MagicMock()
+    with patch("arcana.cli.deploy.docker_client", return_value=dc), patch(
+        "arcana.core.deploy.build.docker_client", return_value=dc
+    ):
+        result = cli_runner(
+            build,
+            [
+                str(spec_path),
+                "testorg",
+                "--build-dir",
+                str(build_dir),
+                "--raise-errors",
+                "--dont-check-registry",
+                "--cache-from",
+                cache_images[0],
+                "--cache-from",
+                cache_images[1],
+            ],
+        )
+    assert result.exit_code == 0, show_cli_trace(result)
+    assert [c.args[0] for c in dc.api.pull.call_args_list] == cache_images
+    build_kwargs = dc.images.build.call_args.kwargs
+    assert build_kwargs["tag"] == "testorg/concatenate:1.0"
+    assert build_kwargs["cache_from"] == cache_images
+    assert "buildargs" not in build_kwargs
+
+
 def test_deploy_rebuild_cli(command_spec, docker_registry, cli_runner, run_prefix):
     """Tests the check to see whether"""
 
@@ -655,3 +704,17 @@ def test_pull_auth_refresh(xnat_repository, work_dir, cli_runner):
     assert xnat.connect(
         xnat_repository.server, user=auth["alias"], password=auth["secret"]
     )
+
+
+def test_cli_import_does_not_load_docker():
+    # Run in a separate interpreter as docker is already imported by this module
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, arcana.cli; assert 'docker' not in sys.modules",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    assert result.returncode == 0, result.stdout.decode()
@@ -7,6 +7,7 @@ import hashlib
 import logging
 import shutil
 from abc import ABCMeta, abstractmethod
+from functools import lru_cache
 import attrs
 from attrs.converters import optional
 from pydra.engine.core import LazyField, Workflow
@@ -257,6 +258,9 @@ class FileGroup(DataItem, metaclass=ABCMeta):
     alternative_names = ()
 
     HASH_CHUNK_SIZE = 2**20  # 1MB in calc. checksums to avoid mem. issues
+    # Needs to match the algorithm used by stores that provide their own checksums
+    # (e.g. XNAT), as they are compared against calculated ones
+    HASH_ALGORITHM = "md5"
 
     @fs_path.validator
     def validate_fs_path(self, _, fs_path):
@@ -368,13 +372,15 @@ class FileGroup(DataItem, metaclass=ABCMeta):
         self._check_exists()
         checksums = {}
         for fpath in self.all_file_paths():
-            fhash = hashlib.md5()
-            with open(fpath, "rb") as f:
-                # Calculate hash in chunks so we don't run out of memory for
-                # large files.
-                for chunk in iter(lambda: f.read(self.HASH_CHUNK_SIZE), b""):
-                    fhash.update(chunk)
-            checksums[fpath] = fhash.hexdigest()
+            # Skip rehashing files that haven't changed since they were last hashed
+            stat = os.stat(fpath)
+            checksums[fpath] = file_digest(
+                str(fpath),
+                stat.st_mtime_ns,
+                stat.st_size,
+                self.HASH_ALGORITHM,
+                self.HASH_CHUNK_SIZE,
+            )
         checksums = self.generalise_checksum_keys(checksums)
         return checksums
 
@@ -1110,3 +1116,41 @@ class BaseDirectory(FileGroup):
         cpy = copy(self)
         cpy.set_fs_paths([fs_path])
         return cpy
+
+
+@lru_cache(maxsize=4096)
+def file_digest(
+    fpath: str, mtime_ns: int, size: int, algorithm: str, chunk_size: int
+) -> str:
+    """Calculates the digest of a file, caching the result so that files that
+    haven't been modified (i.e. have the same modification time and size) since
+    they were last hashed aren't read again
+
+    Parameters
+    ----------
+    fpath : str
+        path to the file to hash
+    mtime_ns : int
+        modification time of the file in nanoseconds (part of the cache key only)
+    size : int
+        size of the file in bytes (part of the cache key only)
+    algorithm : str
+        name of the hashlib algorithm to use
+    chunk_size : int
+        size of the chunks to read the file in (for Python < 3.11)
+
+    Returns
+    -------
+    str
+        the hex digest of the file
+    """
+    with open(fpath, "rb") as f:
+        if hasattr(hashlib, "file_digest"):  # Python >= 3.11
+            fhash = hashlib.file_digest(f, algorithm)
+        else:
+            fhash = hashlib.new(algorithm)
+            # Calculate hash in chunks so we don't run out of memory for
+            # large files.
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                fhash.update(chunk)
+    return fhash.hexdigest()
@@ -162,7 +162,9 @@ class DataSpace(Enum):
         bool
             True if self is parent of child
         """
-        return ((self & child) == self) and (child != self or if_match)
+        # Compare the bit-masks directly rather than creating a new member via '&'
+        value = self.value
+        return (value & child.value) == value and (child.value != value or if_match)
 
     def tostr(self):
         return f"{class_location(self)}[{str(self)}]"
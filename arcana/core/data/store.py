@@ -16,6 +16,9 @@ DS = ty.TypeVar("DS", bound="DataStore")
 
 logger = logging.getLogger("arcana")
 
+# Use the libyaml-based dumper where PyYAML has been built with it
+YamlDumper = getattr(yaml, "CDumper", yaml.Dumper)
+
 
 @attrs.define
 class DataStore(metaclass=ABCMeta):
@@ -390,7 +393,7 @@ class DataStore(metaclass=ABCMeta):
         if config_path is None:
             config_path = get_config_file_path(cls.CONFIG_NAME)
         with open(config_path, "w") as f:
-            yaml.dump(entries, f)
+            yaml.dump(entries, f, Dumper=YamlDumper)
 
     def __enter__(self):
         # This allows the store to be used within nested contexts
@@ -1,75 +1,37 @@
+import pytest
 from arcana.data.spaces.medimage import Clinical
 
 
-def test_is_parent():
-    assert not Clinical.session.is_parent(Clinical.session)
-    assert not Clinical.session.is_parent(Clinical.subject)
-    assert not Clinical.session.is_parent(Clinical.member)
-    assert not Clinical.session.is_parent(Clinical.group)
-    assert not Clinical.session.is_parent(Clinical.timepoint)
-    assert not Clinical.session.is_parent(Clinical.batch)
-    assert not Clinical.session.is_parent(Clinical.matchedpoint)
-    assert not Clinical.session.is_parent(Clinical.dataset)
-
-    assert Clinical.member.is_parent(Clinical.session)
-    assert Clinical.member.is_parent(Clinical.subject)
-    assert not Clinical.member.is_parent(Clinical.member)
-    assert not Clinical.member.is_parent(Clinical.group)
-    assert not Clinical.member.is_parent(Clinical.timepoint)
-    assert not Clinical.member.is_parent(Clinical.batch)
-    assert Clinical.member.is_parent(Clinical.matchedpoint)
-    assert not Clinical.member.is_parent(Clinical.dataset)
-
-    assert Clinical.group.is_parent(Clinical.session)
-    assert Clinical.group.is_parent(Clinical.subject)
-    assert not Clinical.group.is_parent(Clinical.member)
-    assert not Clinical.group.is_parent(Clinical.group)
-    assert not Clinical.group.is_parent(Clinical.timepoint)
-    assert Clinical.group.is_parent(Clinical.batch)
-    assert not Clinical.group.is_parent(Clinical.matchedpoint)
-    assert not Clinical.group.is_parent(Clinical.dataset)
-
-    assert Clinical.timepoint.is_parent(Clinical.session)
-    assert not Clinical.timepoint.is_parent(Clinical.subject)
-    assert not Clinical.timepoint.is_parent(Clinical.member)
-    assert not Clinical.timepoint.is_parent(Clinical.group)
-    assert not Clinical.timepoint.is_parent(Clinical.timepoint)
-    assert Clinical.timepoint.is_parent(Clinical.batch)
-    assert Clinical.timepoint.is_parent(Clinical.matchedpoint)
-    assert not Clinical.timepoint.is_parent(Clinical.dataset)
-
-    assert Clinical.subject.is_parent(Clinical.session)
-    assert not Clinical.subject.is_parent(Clinical.subject)
-    assert not Clinical.subject.is_parent(Clinical.member)
-    assert not Clinical.subject.is_parent(Clinical.group)
-    assert not Clinical.subject.is_parent(Clinical.timepoint)
-    assert not Clinical.subject.is_parent(Clinical.batch)
-    assert not Clinical.subject.is_parent(Clinical.matchedpoint)
-    assert not Clinical.subject.is_parent(Clinical.dataset)
-
-    assert Clinical.batch.is_parent(Clinical.session)
-    assert not Clinical.batch.is_parent(Clinical.subject)
-    assert not Clinical.batch.is_parent(Clinical.member)
-    assert not Clinical.batch.is_parent(Clinical.group)
-    assert not Clinical.batch.is_parent(Clinical.timepoint)
-    assert not Clinical.batch.is_parent(Clinical.batch)
-    assert not Clinical.batch.is_parent(Clinical.matchedpoint)
-    assert not Clinical.batch.is_parent(Clinical.dataset)
-
-    assert Clinical.matchedpoint.is_parent(Clinical.session)
-    assert not Clinical.matchedpoint.is_parent(Clinical.subject)
-    assert not Clinical.matchedpoint.is_parent(Clinical.member)
-    assert not Clinical.matchedpoint.is_parent(Clinical.group)
-    assert not Clinical.matchedpoint.is_parent(Clinical.timepoint)
-    assert not Clinical.matchedpoint.is_parent(Clinical.batch)
-    assert not Clinical.matchedpoint.is_parent(Clinical.matchedpoint)
-    assert not Clinical.matchedpoint.is_parent(Clinical.dataset)
-
-    assert Clinical.dataset.is_parent(Clinical.session)
-    assert Clinical.dataset.is_parent(Clinical.subject)
-    assert Clinical.dataset.is_parent(Clinical.member)
-    assert Clinical.dataset.is_parent(Clinical.group)
-    assert Clinical.dataset.is_parent(Clinical.timepoint)
-    assert Clinical.dataset.is_parent(Clinical.batch)
-    assert Clinical.dataset.is_parent(Clinical.matchedpoint)
-    assert not Clinical.dataset.is_parent(Clinical.dataset)
+# The frequencies each frequency is expected to be a parent of. All other
+# (parent, child) combinations are expected not to be
+EXPECTED_CHILDREN = {
+    Clinical.session: set(),
+    Clinical.member: {Clinical.session, Clinical.subject, Clinical.matchedpoint},
+    Clinical.group: {Clinical.session, Clinical.subject, Clinical.batch},
+    Clinical.timepoint: {Clinical.session, Clinical.batch, Clinical.matchedpoint},
+    Clinical.subject: {Clinical.session},
+    Clinical.batch: {Clinical.session},
+    Clinical.matchedpoint: {Clinical.session},
+    Clinical.dataset: {
+        Clinical.session,
+        Clinical.subject,
+        Clinical.member,
+        Clinical.group,
+        Clinical.timepoint,
+        Clinical.batch,
+        Clinical.matchedpoint,
+    },
+}
+
+
+@pytest.mark.parametrize(
+    "parent,child,expected",
+    [
+        (parent, child, child in children)
+        for parent, children in EXPECTED_CHILDREN.items()
+        for child in EXPECTED_CHILDREN
+    ],
+    ids=str,
+)
+def test_is_parent(parent, child, expected):
+    assert parent.is_parent(child) is expected
@@ -1,21 +1,27 @@
-import setuptools.sandbox
+from __future__ import annotations
+import os
+import sys
+import subprocess
 import typing as ty
 from pathlib import Path
 import json
 import tempfile
+import tarfile
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 import logging
-from datetime import datetime
-from copy import copy
 import shutil
-from natsort import natsorted
-import docker
+from copy import deepcopy
+from functools import lru_cache
 import yaml
-from neurodocker.reproenv import DockerRenderer
 from arcana import __version__
-from arcana.core.utils import set_cwd
+from arcana.core.utils import get_home_dir
 from arcana.__about__ import PACKAGE_NAME, python_versions
 from arcana.exceptions import ArcanaBuildError
-from .utils import PipSpec, local_package_location
+from .utils import PipSpec, local_package_location, docker_client
+
+if ty.TYPE_CHECKING:
+    from neurodocker.reproenv import DockerRenderer
 
 
 logger = logging.getLogger("arcana")
@@ -25,10 +31,35 @@ PYTHON_PACKAGE_DIR = "python-packages"
 
 CONDA_ENV = "arcana"
 
+# System packages installed in every image
+REQUIRED_SYSTEM_PACKAGES = ("git", "ssh-client", "vim")
+
+# Sub-directory of the Arcana home directory to cache source distributions in
+SDIST_CACHE_DIR = "sdist-cache"
+# Directories in local package source trees that don't affect their sdists (in
+# addition to hidden directories, "*.egg-info" directories and virtualenvs)
+SOURCE_TREE_IGNORE = ("dist", "build", "__pycache__")
+# Files in the '.git' directory that determine the version of the package
+# generated by versioneer (i.e. the current commit and the tags)
+GIT_VERSION_PATHS = ("HEAD", "packed-refs", "refs/tags")
+
 SPEC_PATH = "/arcana-spec.yaml"
 
+# The most recent of the Python versions supported by Arcana, which is the one
+# installed in the images
+LATEST_PYTHON_VERSION = max(
+    python_versions, key=lambda v: tuple(map(int, v.split(".")))
+)
+# Packages installed into the conda environment before the Python packages
+CONDA_INSTALL = " ".join(("python=" + LATEST_PYTHON_VERSION, "numpy", "traits"))
 
-def build_docker_image(image_tag: str, build_dir: Path = None, **kwargs):
+
+def build_docker_image(
+    image_tag: str,
+    build_dir: Path = None,
+    cache_from: ty.Iterable[str] = (),
+    **kwargs,
+):
     """Executes the full build workflow, from generating the Dockerfile to
     calling Docker to build it
 
@@ -37,15 +68,23 @@ def build_docker_image(image_tag: str, build_dir: Path = None, **kwargs):
     image_tag : str
         _description_
     build_dir : Path, optional
-        _description_, by default None
+        the directory to build the image in, by default a temporary directory that
+        is removed after the build
+    cache_from : Iterable[str], optional
+        images to use as layer-cache sources, passed on to `dockerfile_build`
     """
     if build_dir is None:
-        build_dir = tempfile.mkdtemp()
+        # Clean up the temporary build directory once the image has been built
+        with tempfile.TemporaryDirectory() as tmp_build_dir:
+            build_docker_image(
+                image_tag, build_dir=tmp_build_dir, cache_from=cache_from, **kwargs
+            )
+        return
     build_dir = Path(build_dir)
 
     dockerfile = construct_dockerfile(build_dir, **kwargs)
 
-    dockerfile_build(dockerfile, build_dir, image_tag)
+    dockerfile_build(dockerfile, build_dir, image_tag, cache_from=cache_from)
 
 
 def construct_dockerfile(
@@ -54,7 +93,7 @@ def construct_dockerfile(
     python_packages: ty.Iterable[
         PipSpec or ty.Dict[str, str] or ty.Tuple[str, str]
     ] = None,
-    system_packages: ty.Iterable[ty.Iterable[ty.Tuple[str, str]]] = None,
+    system_packages: ty.Iterable[ty.Union[str, ty.Tuple[str, str]]] = None,
     package_templates: ty.Iterable[ty.Dict[str, str]] = None,
     labels: ty.Dict[str, str] = None,
     package_manager: str = "apt",
@@ -78,7 +117,7 @@ def construct_dockerfile(
     python_packages:  Iterable[PipSpec or dict[str, str] or tuple[str, str]], optional
         Name and version of the Python PyPI packages to add to the image (in
         addition to Arcana itself)
-    system_packages: Iterable[str], optional
+    system_packages: Iterable[str or tuple[str, str]], optional
         Name and version of operating system packages (see Neurodocker) to add
         to the image
     package_templates : Iterable[dict[str, str]]
@@ -133,23 +172,29 @@ def construct_dockerfile(
     if not build_dir.is_dir():
         raise ArcanaBuildError(f"Build dir '{str(build_dir)}' is not a valid directory")
 
-    dockerfile = DockerRenderer(package_manager).from_(base_image)
-    dockerfile.install(["git", "ssh-client", "vim"])
-
-    if system_packages is not None:
-        install_system_packages(dockerfile, system_packages)
-
-    if package_templates is not None:
-        install_package_templates(dockerfile, package_templates)
-
-    install_python(
-        dockerfile,
+    resolved = resolve_python_packages(
         python_packages,
         build_dir,
         use_local_packages=use_local_packages,
         pypi_fallback=pypi_fallback,
     )
 
+    # Packages from PyPI (or URLs) are installed along with Python itself, while
+    # local packages, whose source distributions are regenerated on every build,
+    # are copied in and installed in a later layer so that changes to them don't
+    # invalidate the cached Python installation layer
+    dockerfile = base_dockerfile(
+        base_image,
+        package_manager=package_manager,
+        system_packages=system_packages,
+        package_templates=package_templates,
+        python_packages=[p for p, s in resolved if not s],
+    )
+
+    install_local_python_packages(
+        dockerfile, [(p, s) for p, s in resolved if s], build_dir
+    )
+
     # Arcana is installed separately from the other Python packages, partly so
     # the dependency Docker layer can be cached in dev and partly so it can be
     # treated differently if required in the future
@@ -176,6 +221,9 @@ def construct_dockerfile(
 
     if labels:
         # dockerfile.label(labels)
+        # NB: json.dumps is used to quote and escape the values (already strings in
+        # general) so they are valid Dockerfile LABEL values, so it can't be
+        # replaced by a plain str()
         dockerfile._parts.append(
             "LABEL "
             + " \\\n      ".join(f"{k}={json.dumps(v)}" for k, v in labels.items())
@@ -184,7 +232,12 @@ def construct_dockerfile(
     return dockerfile
 
 
-def dockerfile_build(dockerfile: DockerRenderer, build_dir: Path, image_tag: str):
+def dockerfile_build(
+    dockerfile: DockerRenderer,
+    build_dir: Path,
+    image_tag: str,
+    cache_from: ty.Iterable[str] = (),
+):
     """Builds the dockerfile in the specified build directory
 
     Parameters
@@ -195,18 +248,32 @@ def dockerfile_build(dockerfile: DockerRenderer, build_dir: Path, image_tag: str
         path of the build directory
     image_tag : str
         Docker image tag to assign to the built image
+    cache_from : Iterable[str], optional
+        images (e.g. previous builds of the same image pushed to the registry) to
+        pull and use as layer-cache sources, so unchanged layers aren't rebuilt
     """
 
+    import docker.errors
+
     # Save generated dockerfile to file
     out_file = build_dir / "Dockerfile"
     out_file.parent.mkdir(exist_ok=True, parents=True)
-    with open(str(out_file), "w") as f:
-        f.write(dockerfile.render())
+    out_file.write_text(dockerfile.render())
     logger.info("Dockerfile for '%s' generated at %s", image_tag, str(out_file))
 
-    dc = docker.from_env()
+    dc = docker_client()
+    cache_from = list(cache_from)
+    for cache_image in cache_from:
+        try:
+            dc.api.pull(cache_image)
+        except docker.errors.APIError:
+            logger.info("Could not pull '%s' to use as build cache", cache_image)
     try:
-        dc.images.build(path=str(build_dir), tag=image_tag)
+        dc.images.build(
+            path=str(build_dir),
+            tag=image_tag,
+            cache_from=cache_from,
+        )
     except docker.errors.BuildError as e:
         build_log = "\n".join(ln.get("stream", "") for ln in e.build_log)
         raise RuntimeError(
@@ -216,27 +283,115 @@ def dockerfile_build(dockerfile: DockerRenderer, build_dir: Path, image_tag: str
     logging.info("Successfully built docker image %s", image_tag)
 
 
-def install_python(
-    dockerfile: DockerRenderer,
+def base_dockerfile(
+    base_image: str,
+    package_manager: str,
+    system_packages: ty.Iterable[ty.Union[str, ty.Tuple[str, str]]] = None,
+    package_templates: ty.Iterable[ty.Dict[str, str]] = None,
+    python_packages: ty.Iterable[PipSpec] = (),
+) -> DockerRenderer:
+    """Constructs the base of a dockerfile, which installs the system packages,
+    package templates, Python and the Python packages that don't need to be copied
+    into the build directory. As it only depends on its arguments, and rendering
+    the package templates is relatively expensive, the result is cached so that
+    images with the same dependencies can reuse it
+
+    Parameters
+    ----------
+    base_image : str
+        The base image to build from
+    package_manager : str
+        the package manager used by the base image
+    system_packages: Iterable[str or tuple[str, str]], optional
+        Name and version of operating system packages (see Neurodocker) to add
+        to the image
+    package_templates : Iterable[dict[str, str]]
+        Neurodocker package installation templates to be installed inside the image
+    python_packages : Iterable[PipSpec]
+        the python packages to install from PyPI (or URLs)
+
+    Returns
+    -------
+    DockerRenderer
+        a new Neurodocker renderer to append the remaining instructions to
+    """
+    # Convert the arguments into hashable equivalents so the constructed
+    # dockerfile can be cached
+    if system_packages is not None:
+        system_packages = tuple(
+            p if isinstance(p, str) else tuple(p) for p in system_packages
+        )
+    if package_templates is not None:
+        package_templates = tuple(tuple(sorted(t.items())) for t in package_templates)
+    python_packages = tuple(
+        (p.name, p.version, p.url, p.file_path, tuple(p.extras))
+        for p in python_packages
+    )
+    # Return a copy as the remaining instructions will be appended to it
+    return deepcopy(
+        _cached_base_dockerfile(
+            base_image,
+            package_manager,
+            system_packages,
+            package_templates,
+            python_packages,
+        )
+    )
+
+
+@lru_cache(maxsize=32)
+def _cached_base_dockerfile(
+    base_image: str,
+    package_manager: str,
+    system_packages: ty.Optional[ty.Tuple[ty.Union[str, ty.Tuple[str, str]], ...]],
+    package_templates: ty.Optional[ty.Tuple[ty.Tuple[ty.Tuple[str, str], ...], ...]],
+    python_packages: ty.Tuple[tuple, ...],
+) -> DockerRenderer:
+    """Constructs the base dockerfile from the hashable forms of the arguments
+    to `base_dockerfile`. The returned renderer is shared between calls so must
+    not be modified"""
+    from neurodocker.reproenv import DockerRenderer
+
+    dockerfile = DockerRenderer(package_manager).from_(base_image)
+
+    # Install the requested system packages along with the ones Arcana
+    # requires in a single layer (i.e. a single package-manager transaction)
+    system_packages = list(system_packages) if system_packages else []
+    requested = set(p if isinstance(p, str) else p[0] for p in system_packages)
+    install_system_packages(
+        dockerfile,
+        [p for p in REQUIRED_SYSTEM_PACKAGES if p not in requested] + system_packages,
+    )
+
+    if package_templates is not None:
+        install_package_templates(dockerfile, [dict(t) for t in package_templates])
+
+    install_python(
+        dockerfile,
+        [
+            PipSpec(name, version, url, file_path, list(extras))
+            for name, version, url, file_path, extras in python_packages
+        ],
+    )
+    return dockerfile
+
+
+def resolve_python_packages(
     packages: ty.Iterable[PipSpec],
     build_dir: Path,
     use_local_packages: bool = False,
     pypi_fallback: bool = False,
-):
-    """Generate Neurodocker instructions to install an appropriate version of
-    Python and the required Python packages
+) -> ty.List[ty.Tuple[PipSpec, ty.Optional[Path]]]:
+    """Merges the Python packages to install and resolves where they should be
+    installed from, building source distributions of any local packages inside the
+    build directory (see `resolve_pip_spec`)
 
     Parameters
     ----------
-    dockerfile : DockerRenderer
-        the neurodocker renderer to append the install instructions to
     packages : ty.Iterable[PipSpec]
         the python packages (with optional extras) that need to be installed
     build_dir : Path
         the path to the build directory
-    arcana_install_extras : Iterable[str]
-        Optional extras (i.e. as defined in "extras_require" in setup.py) required
-        for the arcana package
     use_local_packages: bool, optional
         Use the python package versions that are installed within the
         current environment, i.e. instead of defaulting to the release from PyPI.
@@ -247,8 +402,9 @@ def install_python(
 
     Returns
     -------
-    list[list[str, list[str, str]]]
-        neurodocker instructions to install python and required packages
+    list[tuple[PipSpec, Path or None]]
+        the resolved packages along with the paths to the source distributions
+        of those that are to be installed from local copies
     """
 
     # # Split out and merge any extras specifications (e.g. "arcana[test]")
@@ -256,21 +412,70 @@ def install_python(
     # Add arcana dependency
     packages = PipSpec.unique(packages, remove_arcana=True)
 
+    # Resolve the packages (building source distributions of local packages)
+    # concurrently as they are independent of each other and spend most of their
+    # time waiting on subprocesses and disk I/O
+    with ThreadPoolExecutor(max_workers=min(8, len(packages)) or 1) as executor:
+        return list(
+            executor.map(
+                lambda p: resolve_pip_spec(
+                    p, build_dir, use_local_packages, pypi_fallback
+                ),
+                packages,
+            )
+        )
+
+
+def install_python(dockerfile: DockerRenderer, packages: ty.Iterable[PipSpec]):
+    """Generate Neurodocker instructions to install an appropriate version of
+    Python and the required Python packages from PyPI (or URLs)
+
+    Parameters
+    ----------
+    dockerfile : DockerRenderer
+        the neurodocker renderer to append the install instructions to
+    packages : ty.Iterable[PipSpec]
+        the resolved python packages (with optional extras) that need to be
+        installed, excluding ones installed from local copies
+    """
     dockerfile.add_registered_template(
         "miniconda",
         version="latest",
         env_name=CONDA_ENV,
         env_exists=False,
-        conda_install=" ".join(
-            ["python=" + natsorted(python_versions)[-1], "numpy", "traits"]
-        ),
-        pip_install=" ".join(
-            pip_spec2str(p, dockerfile, build_dir, use_local_packages, pypi_fallback)
-            for p in packages
-        ),
+        conda_install=CONDA_INSTALL,
+        pip_install=" ".join(pip_spec2str(p, dockerfile, None) for p in packages),
     )
 
 
+def install_local_python_packages(
+    dockerfile: DockerRenderer,
+    packages: ty.Iterable[ty.Tuple[PipSpec, Path]],
+    build_dir: Path,
+):
+    """Generate Neurodocker instructions to copy the source distributions of local
+    Python packages into the image and install them
+
+    Parameters
+    ----------
+    dockerfile : DockerRenderer
+        the neurodocker renderer to append the install instructions to
+    packages : ty.Iterable[tuple[PipSpec, Path]]
+        the resolved local packages along with the paths to their source
+        distributions in the build directory (as returned by `resolve_pip_spec`)
+    build_dir : Path
+        the path to the build directory
+    """
+    pip_str = " ".join(
+        pip_spec2str(p, dockerfile, build_dir, sdist_path=s) for p, s in packages
+    )
+    if pip_str:
+        dockerfile.run(
+            f'bash -c "source activate {CONDA_ENV} \\\n'
+            f'&& python -m pip install --no-cache-dir {pip_str}"'
+        )
+
+
 def install_arcana(
     dockerfile: DockerRenderer,
     build_dir: Path,
@@ -291,30 +496,40 @@ def install_arcana(
     use_local_package : bool
         Use local installation of arcana
     """
-    pip_str = pip_spec2str(
+    pip_spec, sdist_path = resolve_pip_spec(
         PipSpec(PACKAGE_NAME, extras=install_extras),
-        dockerfile,
         build_dir,
         use_local_packages=use_local_package,
         pypi_fallback=False,
     )
+    pip_str = pip_spec2str(pip_spec, dockerfile, build_dir, sdist_path=sdist_path)
     dockerfile.run(
         f'bash -c "source activate {CONDA_ENV} \\\n'
         f'&& python -m pip install --pre --no-cache-dir {pip_str}"'
     )
 
 
-def install_system_packages(dockerfile: DockerRenderer, packages: ty.Iterable[str]):
+def install_system_packages(
+    dockerfile: DockerRenderer,
+    packages: ty.Iterable[ty.Union[str, ty.Tuple[str, str]]],
+):
     """Generate Neurodocker instructions to install systems packages in dockerfile
 
     Parameters
     ----------
     dockerfile : DockerRenderer
         the neurodocker renderer to append the install instructions to
-    system_packages : Iterable[str]
-        the packages to install on the operating system
+    system_packages : Iterable[str or tuple[str, str]]
+        the packages to install on the operating system, either names or
+        (name, version) pairs
     """
-    dockerfile.install(packages)
+    version_sep = "=" if dockerfile.pkg_manager == "apt" else "-"
+    dockerfile.install(
+        [
+            p if isinstance(p, str) else (p[0] + version_sep + p[1] if p[1] else p[0])
+            for p in packages
+        ]
+    )
 
 
 def install_package_templates(
@@ -332,10 +547,9 @@ def install_package_templates(
         with any additional keyword arguments required by the template
     """
     for kwds in package_templates:
-        kwds = copy(
-            kwds
-        )  # so we can pop the name and leave the original dictionary intact
-        dockerfile.add_registered_template(kwds.pop("name"), **kwds)
+        dockerfile.add_registered_template(
+            kwds["name"], **{k: v for k, v in kwds.items() if k != "name"}
+        )
 
 
 def install_licenses(
@@ -410,31 +624,35 @@ def insert_spec(dockerfile: DockerRenderer, spec, build_dir):
     dockerfile.copy(source=["./arcana-spec.yaml"], destination=SPEC_PATH)
 
 
-def pip_spec2str(
+def resolve_pip_spec(
     pip_spec: PipSpec,
-    dockerfile: DockerRenderer,
     build_dir: Path,
     use_local_packages: bool,
     pypi_fallback: bool,
-) -> str:
-    """Generates a string to be passed to `pip` in order to install a package
-    from a "pip specification" object
+) -> ty.Tuple[PipSpec, ty.Optional[Path]]:
+    """Resolves the location a package should be installed from, building a source
+    distribution of it inside the build directory if it is installed locally. Doesn't
+    touch the Dockerfile so can be safely called from multiple threads at once
 
     Parameters
     ----------
     pip_spec : PipSpec
         specification of the package to install
-    dockerfile : DockerRenderer
-        Neurodocker Docker renderer object used to generate the Dockerfile
     build_dir : Path
         path to the directory the Docker image will be built in
     use_local_packages : bool
         whether to prefer local version of package (instead of PyPI version)
+    pypi_fallback : bool
+        whether to fall back to PyPI version when local version doesn't match
+        requested
 
     Returns
     -------
-    str
-        string to be passed to `pip` installer
+    PipSpec
+        the resolved specification of the package
+    Path or None
+        path to the source distribution built within the build directory if the
+        package is to be installed from a local copy
     """
     # Copy the local development versions of Python dependencies into the
     # docker image if present, instead of relying on the PyPI version,
@@ -446,14 +664,47 @@ def pip_spec2str(
             raise ArcanaBuildError(
                 "Cannot specify a package by `file_path`, `version` and/or " "`url`"
             )
-        pkg_build_path = copy_sdist_into_build_dir(pip_spec.file_path, build_dir)
-        pip_str = "/" + PYTHON_PACKAGE_DIR + "/" + pkg_build_path.name
+        sdist_path = copy_sdist_into_build_dir(Path(pip_spec.file_path), build_dir)
+    else:
+        if pip_spec.url and pip_spec.version:
+            raise ArcanaBuildError("Cannot specify a package by `url` and `version`")
+        sdist_path = None
+    return pip_spec, sdist_path
+
+
+def pip_spec2str(
+    pip_spec: PipSpec,
+    dockerfile: DockerRenderer,
+    build_dir: ty.Optional[Path],
+    sdist_path: Path = None,
+) -> str:
+    """Generates a string to be passed to `pip` in order to install a package
+    from a "pip specification" object
+
+    Parameters
+    ----------
+    pip_spec : PipSpec
+        specification of the package to install (as returned by `resolve_pip_spec`)
+    dockerfile : DockerRenderer
+        Neurodocker Docker renderer object used to generate the Dockerfile
+    build_dir : Path or None
+        path to the directory the Docker image will be built in (only required
+        if `sdist_path` is provided)
+    sdist_path : Path, optional
+        path to the source distribution of the package within the build directory
+        (as returned by `resolve_pip_spec`) if it is to be installed from a local copy
+
+    Returns
+    -------
+    str
+        string to be passed to `pip` installer
+    """
+    if sdist_path:
+        pip_str = "/" + PYTHON_PACKAGE_DIR + "/" + sdist_path.name
         dockerfile.copy(
-            source=[str(pkg_build_path.relative_to(build_dir))], destination=pip_str
+            source=[str(sdist_path.relative_to(build_dir))], destination=pip_str
         )
     elif pip_spec.url:
-        if pip_spec.version:
-            raise ArcanaBuildError("Cannot specify a package by `url` and `version`")
         pip_str = pip_spec.url
     else:
         pip_str = pip_spec.name
@@ -488,33 +739,160 @@ def copy_sdist_into_build_dir(local_installation: Path, build_dir: Path):
             f"not {local_installation}"
         )
 
-    # Move existing 'dist' directory out of the way
-    dist_dir = local_installation / "dist"
-    if dist_dir.exists():
-        moved_dist = local_installation / (
-            "dist." + datetime.strftime(datetime.now(), "%Y%m%d%H%M%S")
-        )
-        shutil.move(local_installation / "dist", moved_dist)
-    else:
-        moved_dist = None
+    # Reuse the source distribution generated by a previous build if none of the
+    # files in the package have been modified since
+    pkg_cache_dir = (
+        get_home_dir()
+        / SDIST_CACHE_DIR
+        / hashlib.md5(str(local_installation.resolve()).encode()).hexdigest()
+    )
+    cached_sdist_dir = pkg_cache_dir / source_tree_digest(local_installation)
     try:
-        # Generate source distribution using setuptools
-        with set_cwd(local_installation):
-            setuptools.sandbox.run_setup("setup.py", ["sdist", "--formats", "gztar"])
-        # Copy generated source distribution into build directory
-        sdist_path = next((local_installation / "dist").iterdir())
-        build_dir_pkg_path = build_dir / PYTHON_PACKAGE_DIR / sdist_path.name
-        build_dir_pkg_path.parent.mkdir(exist_ok=True)
-        shutil.copy(sdist_path, build_dir_pkg_path)
-    finally:
-        # Put original 'dist' directory back in its place
-        shutil.rmtree(local_installation / "dist", ignore_errors=True)
-        if moved_dist:
-            shutil.move(moved_dist, local_installation / "dist")
+        sdist_path = next(cached_sdist_dir.iterdir())
+    except (FileNotFoundError, StopIteration):
+        # Clear out source distributions of stale versions of the package
+        shutil.rmtree(pkg_cache_dir, ignore_errors=True)
+        cached_sdist_dir.mkdir(parents=True)
+        # Generate source distribution in a separate process (so the state of the
+        # current interpreter isn't affected) and write it to a temporary directory
+        # within the cache (instead of the package's own 'dist' directory) so it
+        # can be renamed into place without being copied. The build backend
+        # (setuptools) is already installed alongside arcana, so build the sdist
+        # without isolation to avoid creating a fresh virtualenv and downloading
+        # the backend each time (which also fails on offline build hosts)
+        with tempfile.TemporaryDirectory(dir=pkg_cache_dir) as dist_dir:
+            try:
+                subprocess.run(
+                    [
+                        sys.executable,
+                        "-m",
+                        "build",
+                        "--sdist",
+                        "--no-isolation",
+                        "--outdir",
+                        dist_dir,
+                    ],
+                    cwd=local_installation,
+                    check=True,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                )
+            except subprocess.CalledProcessError as e:
+                raise ArcanaBuildError(
+                    f"Could not build source distribution of {local_installation}:"
+                    "\n\n" + e.stdout.decode()
+                )
+            built_path = next(Path(dist_dir).iterdir())
+            sdist_path = cached_sdist_dir / built_path.name
+            built_path.rename(sdist_path)
+    # Link (or copy if not possible) generated source distribution into build
+    # directory
+    build_dir_pkg_path = build_dir / PYTHON_PACKAGE_DIR / sdist_path.name
+    build_dir_pkg_path.parent.mkdir(exist_ok=True)
+    # Leave the source distribution from a previous build in place if its
+    # contents are unchanged, so Docker sees an identical file and can reuse
+    # the cached layers (the regenerated archive only differs in timestamps).
+    # Check whether it is already a hard link to the cached sdist first so the
+    # archives don't need to be decompressed and hashed
+    if not (
+        build_dir_pkg_path.exists()
+        and (
+            os.path.samefile(build_dir_pkg_path, sdist_path)
+            or sdist_digest(build_dir_pkg_path) == sdist_digest(sdist_path)
+        )
+    ):
+        # Remove any existing file first so the cached copy isn't overwritten
+        # through a hard link
+        if build_dir_pkg_path.exists():
+            build_dir_pkg_path.unlink()
+        try:
+            os.link(sdist_path, build_dir_pkg_path)
+        except OSError:
+            shutil.copy(sdist_path, build_dir_pkg_path)
 
     return build_dir_pkg_path
 
 
+def source_tree_digest(src_dir: Path) -> str:
+    """Calculates a digest of the relative paths, modification times and sizes of
+    the files in a Python package's source tree, which changes whenever any of
+    the files are edited, added, moved or deleted. Hidden directories, build
+    artefacts and virtualenvs are skipped, except for the parts of the '.git'
+    directory that determine the version of the package (i.e. the current commit
+    and tags)
+
+    Parameters
+    ----------
+    src_dir : Path
+        path to the root of the source tree
+
+    Returns
+    -------
+    str
+        hex digest of the state of the source tree
+    """
+    dhash = hashlib.md5()
+
+    def add_stat(fpath):
+        stat = os.stat(fpath)
+        dhash.update(
+            f"{os.path.relpath(fpath, src_dir)}:{stat.st_mtime_ns}:"
+            f"{stat.st_size}\n".encode()
+        )
+
+    for dpath, dnames, fnames in os.walk(src_dir):
+        dnames[:] = sorted(
+            d
+            for d in dnames
+            if not (
+                d.startswith(".")
+                or d in SOURCE_TREE_IGNORE
+                or d.endswith(".egg-info")
+                or os.path.exists(os.path.join(dpath, d, "pyvenv.cfg"))
+            )
+        )
+        for fname in sorted(fnames):
+            add_stat(os.path.join(dpath, fname))
+    git_dir = os.path.join(src_dir, ".git")
+    if os.path.isdir(git_dir):
+        for rel_path in GIT_VERSION_PATHS:
+            if os.path.exists(fpath := os.path.join(git_dir, rel_path)):
+                add_stat(fpath)
+        # Include the commit the current branch points to, which is updated in
+        # place (i.e. without changing the HEAD file) on each commit
+        with open(os.path.join(git_dir, "HEAD")) as f:
+            head = f.read().strip()
+        if head.startswith("ref: "):
+            ref_path = os.path.join(git_dir, *head[len("ref: ") :].split("/"))
+            if os.path.exists(ref_path):
+                add_stat(ref_path)
+    return dhash.hexdigest()
+
+
+def sdist_digest(sdist_path: Path) -> str:
+    """Calculates a digest of the names, permissions and contents of the files within
+    a source distribution, ignoring the timestamps that make archives of the same
+    source tree generated at different times differ
+
+    Parameters
+    ----------
+    sdist_path : Path
+        path to the source distribution archive
+
+    Returns
+    -------
+    str
+        hex digest of the archive contents
+    """
+    dhash = hashlib.md5()
+    with tarfile.open(sdist_path) as tf:
+        for member in sorted(tf.getmembers(), key=lambda m: m.name):
+            dhash.update(f"{member.name}:{member.mode}\n".encode())
+            if member.isfile():
+                dhash.update(tf.extractfile(member).read())
+    return dhash.hexdigest()
+
+
 DOCKERFILE_README_TEMPLATE = """
     The following Docker image was generated by arcana v{} to enable the
     commands to be run in the XNAT container service. See
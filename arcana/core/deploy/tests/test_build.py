@@ -0,0 +1,83 @@
+import os
+import tarfile
+from arcana.core.deploy.utils import PipSpec
+from arcana.core.deploy.build import source_tree_digest, sdist_digest, base_dockerfile
+
+
+def test_source_tree_digest(work_dir):
+    src_dir = work_dir / "src"
+    (src_dir / "pkg").mkdir(parents=True)
+    (src_dir / "setup.py").write_text("from setuptools import setup\n")
+    (src_dir / "pkg" / "__init__.py").write_text("a = 1\n")
+    digest = source_tree_digest(src_dir)
+    assert source_tree_digest(src_dir) == digest
+    # Build artefacts, hidden directories and virtualenvs are ignored
+    for artefact_dir in ("build", "dist", "__pycache__", "pkg.egg-info", ".tox"):
+        (src_dir / artefact_dir).mkdir()
+        (src_dir / artefact_dir / "artefact").write_text("ignored")
+    (src_dir / "my-venv").mkdir()
+    (src_dir / "my-venv" / "pyvenv.cfg").write_text("home = /usr/bin\n")
+    assert source_tree_digest(src_dir) == digest
+    # Editing a file changes the digest
+    (src_dir / "pkg" / "__init__.py").write_text("a = 2\n")
+    edited_digest = source_tree_digest(src_dir)
+    assert edited_digest != digest
+    # Only the parts of the git repository that determine the version matter
+    git_dir = src_dir / ".git"
+    (git_dir / "refs" / "heads").mkdir(parents=True)
+    (git_dir / "objects").mkdir()
+    (git_dir / "HEAD").write_text("ref: refs/heads/main\n")
+    (git_dir / "refs" / "heads" / "main").write_text("a" * 40 + "\n")
+    git_digest = source_tree_digest(src_dir)
+    assert git_digest != edited_digest
+    (git_dir / "objects" / "ab").write_text("ignored")
+    (git_dir / "index").write_text("ignored")
+    assert source_tree_digest(src_dir) == git_digest
+    # A new commit on the current branch changes the digest
+    (git_dir / "refs" / "heads" / "main").write_text("b" * 40 + "\n")
+    os.utime(git_dir / "refs" / "heads" / "main", ns=(1_000_000_000, 1_000_000_000))
+    assert source_tree_digest(src_dir) != git_digest
+
+
+def test_sdist_digest(work_dir):
+    src_dir = work_dir / "src"
+    src_dir.mkdir()
+    src_file = src_dir / "setup.py"
+    src_file.write_text("from setuptools import setup\n")
+
+    def make_sdist(name, mtime):
+        os.utime(src_file, (mtime, mtime))
+        sdist_path = work_dir / name
+        with tarfile.open(sdist_path, "w:gz") as tf:
+            tf.add(src_dir, arcname="pkg-1.0")
+        return sdist_path
+
+    first = make_sdist("first.tar.gz", 1_000_000)
+    second = make_sdist("second.tar.gz", 2_000_000)
+    # Archives that only differ in timestamps have the same digest
+    assert first.read_bytes() != second.read_bytes()
+    assert sdist_digest(first) == sdist_digest(second)
+    # Archives with different contents don't
+    src_file.write_text("from setuptools import setup\nsetup()\n")
+    assert sdist_digest(make_sdist("third.tar.gz", 1_000_000)) != sdist_digest(first)
+
+
+def test_base_dockerfile_cache():
+    kwargs = {
+        "base_image": "ubuntu:kinetic",
+        "package_manager": "apt",
+        "system_packages": ["vim", ("git", None)],
+        "python_packages": [PipSpec(name="pydra", version="0.20", extras=["dev"])],
+    }
+    first = base_dockerfile(**kwargs)
+    second = base_dockerfile(**kwargs)
+    assert first is not second
+    assert first.render() == second.render()
+    # Appending to one of the returned renderers doesn't affect the others, or
+    # the ones returned by later calls
+    rendered = second.render()
+    first.run("echo modified")
+    assert second.render() == rendered
+    assert base_dockerfile(**kwargs).render() == rendered
+    # Changing one of the arguments results in a different dockerfile
+    assert base_dockerfile(**dict(kwargs, system_packages=["vim"])).render() != rendered
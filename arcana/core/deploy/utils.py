@@ -1,3 +1,4 @@
+from __future__ import annotations
 import typing as ty
 from pathlib import Path, PosixPath
 import json
@@ -6,10 +7,10 @@ import tempfile
 import tarfile
 import logging
 from itertools import chain
-import pkg_resources
+import importlib_metadata
 import os
+from functools import lru_cache
 from dataclasses import dataclass, field as dataclass_field
-import docker
 from deepdiff import DeepDiff
 import yaml
 from arcana import __version__
@@ -17,6 +18,9 @@ from arcana.__about__ import PACKAGE_NAME
 from arcana.exceptions import ArcanaBuildError
 from arcana.exceptions import ArcanaError
 
+if ty.TYPE_CHECKING:
+    import docker
+
 logger = logging.getLogger("arcana")
 
 
@@ -160,10 +164,8 @@ def local_package_location(pip_spec: PipSpec, pypi_fallback: bool = False):
             name=parts[0], version=(parts[1] if len(parts) == 2 else None)
         )
     try:
-        pkg = next(
-            p for p in pkg_resources.working_set if p.project_name == pip_spec.name
-        )
-    except StopIteration:
+        pkg = importlib_metadata.distribution(pip_spec.name)
+    except importlib_metadata.PackageNotFoundError:
         if pypi_fallback:
             logger.info(
                 f"Did not find local installation of package {pip_spec.name} "
@@ -173,7 +175,7 @@ def local_package_location(pip_spec: PipSpec, pypi_fallback: bool = False):
         raise ArcanaBuildError(
             f"Did not find {pip_spec.name} in installed working set:\n"
             + "\n".join(
-                sorted(p.key + "/" + p.project_name for p in pkg_resources.working_set)
+                sorted(d.metadata["Name"] for d in importlib_metadata.distributions())
             )
         )
     if (
@@ -191,7 +193,7 @@ def local_package_location(pip_spec: PipSpec, pypi_fallback: bool = False):
             logger.warning(msg + " falling back to installation from PyPI")
             return pip_spec
         raise ArcanaBuildError(msg)
-    pkg_loc = Path(pkg.location).resolve()
+    pkg_loc = Path(pkg.locate_file("")).resolve()
     # Determine whether installed version of requirement is locally
     # installed (and therefore needs to be copied into image) or can
     # be just downloaded from PyPI
@@ -204,10 +206,9 @@ def local_package_location(pip_spec: PipSpec, pypi_fallback: bool = False):
     else:
         # Check to see whether package is installed via "direct URL" instead
         # of through PyPI
-        direct_url_path = Path(pkg.egg_info) / "direct_url.json"
-        if direct_url_path.exists():
-            with open(direct_url_path) as f:
-                url_spec = json.load(f)
+        direct_url_json = pkg.read_text("direct_url.json")
+        if direct_url_json is not None:
+            url_spec = json.loads(direct_url_json)
             url = url_spec["url"]
             vcs_info = url_spec.get(
                 "vcs_info", url_spec
@@ -232,6 +233,22 @@ def local_package_location(pip_spec: PipSpec, pypi_fallback: bool = False):
     return pip_spec
 
 
+@lru_cache(maxsize=1)
+def docker_client() -> docker.DockerClient:
+    """Returns a Docker client connected to the daemon configured in the
+    environment, which is created on the first call and reused afterwards to avoid
+    repeating the connection setup and API version negotiation
+
+    Returns
+    -------
+    docker.DockerClient
+        the shared Docker client
+    """
+    import docker
+
+    return docker.from_env()
+
+
 def extract_file_from_docker_image(
     image_tag: str, file_path: PosixPath, out_path: Path = None
 ) -> Path:
@@ -249,10 +266,12 @@ def extract_file_from_docker_image(
     Path
         path to the extracted file
     """
+    import docker.errors
+
     tmp_dir = Path(tempfile.mkdtemp())
     if out_path is None:
         out_path = tmp_dir / "extracted-dir"
-    dc = docker.from_env()
+    dc = docker_client()
     try:
         dc.api.pull(image_tag)
     except docker.errors.APIError as e:
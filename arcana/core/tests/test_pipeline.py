@@ -34,10 +34,9 @@ def test_pipeline(work_dir):
 
     dataset.refresh()  # Reset cached values
 
+    expected_contents = "\n".join(["file1.txt", "file2.txt"] * 2)
     for item in dataset["deriv"]:
-        with open(item.fs_path) as f:
-            contents = f.read()
-        assert contents == "\n".join(["file1.txt", "file2.txt"] * 2)
+        assert Path(item.fs_path).read_text() == expected_contents
 
 
 def test_pipeline_with_implicit_conversion(work_dir):
@@ -66,10 +65,9 @@ def test_pipeline_with_implicit_conversion(work_dir):
 
     dataset.refresh()
 
+    expected_contents = "\n".join(["file1.zip", "file2.zip"] * 2)
     for item in dataset["deriv"]:
         tmp_dir = Path(tempfile.mkdtemp())
         with zipfile.ZipFile(item.fs_path) as zfile:
             zfile.extractall(path=tmp_dir)
-        with open(tmp_dir / "out_u_file.txt") as f:
-            contents = f.read()
-        assert contents == "\n".join(["file1.zip", "file2.zip"] * 2)
+        assert (tmp_dir / "out_u_file.txt").read_text() == expected_contents
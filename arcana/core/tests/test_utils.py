@@ -1,4 +1,14 @@
-from arcana.core.utils import package_from_module, path2varname, varname2path
+import os
+import sys
+import errno
+from unittest.mock import patch
+import pytest
+from arcana.core.utils import (
+    package_from_module,
+    path2varname,
+    varname2path,
+    clone_or_copy,
+)
 
 
 def test_package_from_module():
@@ -24,3 +34,31 @@ def test_path2varname():
         assert path2varname(path) == varname
         assert varname2path(varname) == path
         assert varname2path(varname2path(path2varname(path2varname(path)))) == path
+
+
+def test_clone_or_copy(work_dir):
+    src = work_dir / "src.txt"
+    src.write_text("original")
+    os.utime(src, ns=(1_000_000_000, 1_000_000_000))
+    dst = work_dir / "dst.txt"
+    assert clone_or_copy(str(src), str(dst)) == str(dst)
+    assert dst.read_text() == "original"
+    assert os.stat(dst).st_mtime_ns == 1_000_000_000
+    # Writing to the copy doesn't affect the original
+    dst.write_text("modified")
+    assert src.read_text() == "original"
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="FICLONE is only used on Linux"
+)
+def test_clone_or_copy_fallback(work_dir):
+    src = work_dir / "src.txt"
+    src.write_text("original")
+    dst = work_dir / "dst.txt"
+    with patch(
+        "fcntl.ioctl", side_effect=OSError(errno.EOPNOTSUPP, "Not supported")
+    ) as ioctl:
+        assert clone_or_copy(str(src), str(dst)) == str(dst)
+    ioctl.assert_called_once()
+    assert dst.read_text() == "original"
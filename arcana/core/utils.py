@@ -13,9 +13,11 @@ from pathlib import Path
 from importlib import import_module
 from inspect import isclass
 from itertools import zip_longest
-import pkg_resources
 import os.path
+import sys
+import shutil
 from contextlib import contextmanager
+from functools import lru_cache
 from collections.abc import Iterable
 import logging
 import cloudpickle as cp
@@ -114,6 +116,14 @@ PATH_ESCAPES = {
     "XXX": "__tripplex__",
 }
 
+# Single characters are escaped in one pass with str.translate, as none of the
+# escape sequences contain characters that are escaped after them, then any
+# multi-character sequences are replaced
+PATH_CHAR_ESCAPES = str.maketrans(
+    {c: e for c, e in PATH_ESCAPES.items() if len(c) == 1}
+)
+PATH_SEQUENCE_ESCAPES = [(s, e) for s, e in PATH_ESCAPES.items() if len(s) > 1]
+
 PATH_NAME_PREFIX = "XXX"
 
 EMPTY_PATH_NAME = "__empty__"
@@ -136,9 +146,9 @@ def path2varname(path):
     if not path:
         name = EMPTY_PATH_NAME
     else:
-        name = path
-        for char, esc in PATH_ESCAPES.items():
-            name = name.replace(char, esc)
+        name = path.translate(PATH_CHAR_ESCAPES)
+        for seq, esc in PATH_SEQUENCE_ESCAPES:
+            name = name.replace(seq, esc)
     if name.startswith("_"):
         name = PATH_NAME_PREFIX + name
     return name
@@ -356,6 +366,42 @@ def dir_modtime(dpath):
     return max(os.path.getmtime(d) for d, _, _ in os.walk(dpath))
 
 
+FICLONE = 0x40049409  # Linux ioctl request code to clone a file (linux/fs.h)
+
+
+def clone_or_copy(src: str, dst: str) -> str:
+    """Copies a file, cloning it on Linux file-systems that support it (e.g. Btrfs,
+    XFS) so the data blocks are shared copy-on-write instead of being duplicated,
+    and falling back to a regular copy otherwise. Can be used as the copy
+    function of `shutil.copytree`. Hard-links aren't used so that subsequent
+    writes to either path don't affect the other
+
+    Parameters
+    ----------
+    src : str
+        path of the file to copy
+    dst : str
+        path to copy the file to
+
+    Returns
+    -------
+    str
+        the destination path
+    """
+    if sys.platform.startswith("linux"):
+        import fcntl
+
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            pass  # cloning not supported by the file-system, fallback to copy
+        else:
+            shutil.copystat(src, dst)
+            return dst
+    return shutil.copy2(src, dst)
+
+
 # def parse_single_value(value, format=None):
 #     """
 #     Tries to convert to int, float and then gives up and assumes the value
@@ -565,6 +611,9 @@ def package_from_module(module: Sequence[str]):
         except AttributeError:
             module_path = module
         module_paths.add(importlib_metadata.PackagePath(module_path.replace(".", "/")))
+    # pkg_resources is slow to import, so only load it when it is needed
+    import pkg_resources
+
     packages = set()
     for pkg in pkg_resources.working_set:
         try:
@@ -612,9 +661,6 @@ def asdict(obj, omit: ty.Iterable[str] = (), required_modules: set = None):
     required_modules: set
         modules required to reload the serialised object into memory"""
 
-    def filter(atr, value):
-        return atr.init and atr.metadata.get("asdict", True)
-
     if required_modules is None:
         required_modules = set()
         include_versions = True  # Assume top-level dictionary so need to include
@@ -625,19 +671,23 @@ def asdict(obj, omit: ty.Iterable[str] = (), required_modules: set = None):
         required_modules.add(klass.__module__)
         return "<" + class_location(klass) + ">"
 
+    def attrs_asdict(value, omit=()):
+        return {
+            a.name: value_asdict(getattr(value, a.name))
+            for a in attrs.fields(type(value))
+            if a.init and a.metadata.get("asdict", True) and a.name not in omit
+        }
+
     def value_asdict(value):
-        if isclass(value):
+        if value is None or type(value) in (str, int, float, bool):
+            pass  # Skip checks for the common case of plain values
+        elif isclass(value):
             value = serialise_class(value)
         elif hasattr(value, "asdict"):
             value = value.asdict(required_modules=required_modules)
         elif attrs.has(value):  # is class with attrs
             value_class = serialise_class(type(value))
-            value = attrs.asdict(
-                value,
-                recurse=False,
-                filter=filter,
-                value_serializer=lambda i, f, v: value_asdict(v),
-            )
+            value = attrs_asdict(value)
             value["class"] = value_class
         elif isinstance(value, Enum):
             value = serialise_class(type(value)) + "[" + str(value) + "]"
@@ -653,12 +703,7 @@ def asdict(obj, omit: ty.Iterable[str] = (), required_modules: set = None):
             ]
         return value
 
-    dct = attrs.asdict(
-        obj,
-        recurse=False,
-        filter=lambda a, v: filter(a, v) and a.name not in omit,
-        value_serializer=lambda i, f, v: value_asdict(v),
-    )
+    dct = attrs_asdict(obj, omit=omit)
 
     dct["class"] = serialise_class(type(obj))
     if include_versions:
@@ -737,6 +782,24 @@ extract_import_re = re.compile(r"\s*(?:from|import)\s+([\w\.]+)")
 NOTHING_STR = "__PIPELINE_INPUT__"
 
 
+@lru_cache(maxsize=128)
+def unpickle_function(pickled: bytes) -> ty.Callable:
+    """Unpickles the function wrapped by a Pydra FunctionTask, caching the result
+    so that tasks created from the same function only unpickle it once
+
+    Parameters
+    ----------
+    pickled : bytes
+        the cloudpickled function (i.e. the `_func` input of the task)
+
+    Returns
+    -------
+    Callable
+        the unpickled function
+    """
+    return cp.loads(pickled)
+
+
 def pydra_asdict(
     obj: TaskBase, required_modules: ty.Set[str], workflow: Workflow = None
 ) -> dict:
@@ -768,7 +831,7 @@ def pydra_asdict(
             outputs[outpt_name] = {"pydra_task": lf.name, "pydra_field": lf.field}
     else:
         if isinstance(obj, FunctionTask):
-            func = cp.loads(obj.inputs._func)
+            func = unpickle_function(obj.inputs._func)
             module = inspect.getmodule(func)
             dct["class"] = "<" + module.__name__ + ":" + func.__name__ + ">"
             required_modules.add(module.__name__)
@@ -1,4 +1,5 @@
 import attrs
+import csv
 import json
 import typing as ty
 from dataclasses import dataclass
@@ -19,14 +20,11 @@ class ContainerMetadata:
     uri: str = None
 
     def to_dict(self, **kwargs):
-        dct = {}
-        if self.type:
-            dct["Type"] = self.type
-        if self.tag:
-            dct["Tag"] = self.tag
-        if self.uri:
-            dct["URI"] = self.uri
-        return dct
+        return {
+            k: v
+            for k, v in (("Type", self.type), ("Tag", self.tag), ("URI", self.uri))
+            if v
+        }
 
     @classmethod
     def fromdict(cls, dct):
@@ -48,12 +46,15 @@ class GeneratorMetadata:
 
     def to_dict(self, **kwargs):
         dct = {"Name": self.name}
-        if self.version:
-            dct["Version"] = self.version
-        if self.description:
-            dct["Description"] = self.description
-        if self.code_url:
-            dct["CodeURL"] = self.code_url
+        dct.update(
+            (k, v)
+            for k, v in (
+                ("Version", self.version),
+                ("Description", self.description),
+                ("CodeURL", self.code_url),
+            )
+            if v
+        )
         if self.container:
             dct["Container"] = self.container.to_dict()
         return dct
@@ -77,14 +78,15 @@ class SourceDatasetMetadata:
     version: str = None
 
     def to_dict(self, **kwargs):
-        dct = {}
-        if self.url:
-            dct["URL"] = self.url
-        if self.doi:
-            dct["DOI"] = self.doi
-        if self.version:
-            dct["Version"] = self.version
-        return dct
+        return {
+            k: v
+            for k, v in (
+                ("URL", self.url),
+                ("DOI", self.doi),
+                ("Version", self.version),
+            )
+            if v
+        }
 
     @classmethod
     def fromdict(cls, dct):
@@ -178,20 +180,25 @@ class BidsDataset(Dataset):
             authors=authors,
             **kwargs,
         )
-        # Create rows
+        # Add the BIDS prefixes to the IDs if not already present
+        subject_ids = [s if s.startswith("sub-") else f"sub-{s}" for s in subject_ids]
+        if session_ids:
+            session_ids = [
+                s if s.startswith("ses-") else f"ses-{s}" for s in session_ids
+            ]
+        # Create rows. The row directories are created directly under the subject
+        # directory, which is created once per subject, instead of resolving the
+        # absolute path of each row via the store
         for subject_id in subject_ids:
-            if not subject_id.startswith("sub-"):
-                subject_id = f"sub-{subject_id}"
             dataset.participants[subject_id] = {}
+            subject_dir = path / subject_id
+            subject_dir.mkdir(exist_ok=True)
             if session_ids:
                 for session_id in session_ids:
-                    if not session_id.startswith("sub-"):
-                        session_id = f"ses-{session_id}"
-                    row = dataset.add_leaf([subject_id, session_id])
-                    Bids.absolute_row_path(row).mkdir(parents=True)
+                    dataset.add_leaf([subject_id, session_id])
+                    (subject_dir / session_id).mkdir()
             else:
-                row = dataset.add_leaf([subject_id])
-                Bids.absolute_row_path(row).mkdir(parents=True, exist_ok=True)
+                dataset.add_leaf([subject_id])
         dataset.save_metadata()
         return dataset
 
@@ -227,20 +234,22 @@ class BidsDataset(Dataset):
             dct["GeneratedBy"] = [g.to_dict() for g in self.generated_by]
         if self.sources:
             dct["sourceDatasets"] = [d.to_dict() for d in self.sources]
-        with open(self.root_dir / "dataset_description.json", "w") as f:
-            json.dump(dct, f, indent="    ")
+        # Encode in one go and write in a single call instead of streaming the
+        # many small chunks json.dump emits to the file
+        (self.root_dir / "dataset_description.json").write_text(
+            json.dumps(dct, indent="    ")
+        )
 
-        with open(self.root_dir / "participants.tsv", "w") as f:
-            col_names = list(next(iter(self.participants.values())).keys())
-            f.write("\t".join(["participant_id"] + col_names) + "\n")
-            for pcpt_id, pcpt_attrs in self.participants.items():
-                f.write(
-                    "\t".join([pcpt_id] + [pcpt_attrs[c] for c in col_names]) + "\n"
-                )
+        col_names = list(next(iter(self.participants.values())).keys())
+        rows = ["\t".join(["participant_id"] + col_names)]
+        rows.extend(
+            "\t".join([pcpt_id] + [pcpt_attrs[c] for c in col_names])
+            for pcpt_id, pcpt_attrs in self.participants.items()
+        )
+        (self.root_dir / "participants.tsv").write_text("\n".join(rows) + "\n")
 
         if self.readme is not None:
-            with open(self.root_dir / "README", "w") as f:
-                f.write(self.readme)
+            (self.root_dir / "README").write_text(self.readme)
 
     def load_metadata(self):
         description_json_path = self.root_dir / "dataset_description.json"
@@ -249,8 +258,7 @@ class BidsDataset(Dataset):
                 f"Could not find a directory at '{self.id}' containing a "
                 "'dataset_description.json' file"
             )
-        with open(description_json_path) as f:
-            dct = json.load(f)
+        dct = json.loads(description_json_path.read_bytes())
         self.name = dct["Name"]
         self.bids_version = dct["BIDSVersion"]
         self.bids_type = dct.get("DatasetType")
@@ -275,20 +283,12 @@ class BidsDataset(Dataset):
                 SourceDatasetMetadata.fromdict(d) for d in dct["sourceDatasets"]
             ]
 
-        self.participants = {}
-        with open(self.root_dir / "participants.tsv") as f:
-            cols = f.readline()[:-1].split("\t")
-            while True:
-                line = f.readline()[:-1]
-                if not line:
-                    break
-
-                d = dict(zip(cols, line.split("\t")))
-                self.participants[d.pop("participant_id")] = d
+        with open(self.root_dir / "participants.tsv", newline="") as f:
+            reader = csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE)
+            cols = next(reader)[1:]  # first column is "participant_id"
+            self.participants = {
+                row[0]: dict(zip(cols, row[1:])) for row in reader if row
+            }
 
         readme_path = self.root_dir / "README"
-        if readme_path.exists():
-            with open(readme_path) as f:
-                self.readme = f.read()
-        else:
-            self.readme = None
+        self.readme = readme_path.read_text() if readme_path.exists() else None
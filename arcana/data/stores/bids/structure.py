@@ -1,3 +1,4 @@
+import os
 import typing as ty
 import json
 import re
@@ -76,14 +77,19 @@ class Bids(FileSystem):
         except ArcanaEmptyDatasetError:
             return
 
+        multi_session = dataset.is_multi_session()
         for subject_id, participant in dataset.participants.items():
             try:
                 explicit_ids = {"group": participant["group"]}
             except KeyError:
                 explicit_ids = {}
-            if dataset.is_multi_session():
-                for sess_id in (dataset.root_dir / subject_id).iterdir():
-                    dataset.add_leaf([subject_id, sess_id], explicit_ids=explicit_ids)
+            if multi_session:
+                with os.scandir(dataset.root_dir / subject_id) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            dataset.add_leaf(
+                                [subject_id, entry.name], explicit_ids=explicit_ids
+                            )
             else:
                 dataset.add_leaf([subject_id], explicit_ids=explicit_ids)
 
@@ -92,19 +98,27 @@ class Bids(FileSystem):
         root_dir = row.dataset.root_dir
         session_path = root_dir / rel_session_path
         session_path.mkdir(exist_ok=True)
-        for modality_dir in session_path.iterdir():
-            self.find_items_in_dir(modality_dir, row)
+        # Use scandir so directories can be identified from the directory entries
+        # without separate stat calls, only creating paths for the ones needed
+        with os.scandir(session_path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    self.find_items_in_dir(Path(entry.path), row)
         deriv_dir = root_dir / "derivatives"
         if deriv_dir.exists():
-            for pipeline_dir in deriv_dir.iterdir():
-                self.find_items_in_dir(pipeline_dir / rel_session_path, row)
+            with os.scandir(deriv_dir) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        self.find_items_in_dir(Path(entry.path) / rel_session_path, row)
 
     def file_group_stem_path(self, file_group):
         row = file_group.row
-        fs_path = self.root_dir(row)
         parts = file_group.path.split("/")
         if parts[-1] == "":
             parts = parts[:-1]
+        # Collect the path segments to join onto the root directory in one go,
+        # rather than creating a new Path object for each segment
+        segments = []
         if parts[0] == "derivatives":
             if len(parts) < 2:
                 raise ArcanaUsageError(
@@ -116,17 +130,15 @@ class Bids(FileSystem):
                     f"({file_group.path}: {file_group.format})"
                 )
             # append the first to parts of the path before the row ID (e.g. sub-01/ses-02)
-            fs_path = fs_path.joinpath(*parts[:2])
+            segments.extend(parts[:2])
             parts = parts[2:]
-        fs_path /= self.row_path(row)
+        segments.append(self.row_path(row))
         if parts:  # The whole derivatives directories can be the output for a BIDS app
-            for part in parts[:-1]:
-                fs_path /= part
-            fname = (
+            segments.extend(parts[:-1])
+            segments.append(
                 "_".join(row.ids[h] for h in row.dataset.hierarchy) + "_" + parts[-1]
             )
-            fs_path /= fname
-        return fs_path
+        return self.root_dir(row).joinpath(*segments)
 
     def fields_json_path(self, field):
         parts = field.path.split("/")
@@ -197,8 +209,7 @@ class Bids(FileSystem):
                 dct = jq.compile(jq_expr).input(lazy_load_json()).first()
         # Write dictionary back to file if it has been loaded
         if dct is not None:
-            with open(fs_path, "w") as f:
-                json.dump(dct, f)
+            Path(fs_path).write_text(json.dumps(dct))
 
 
 def outputs_converter(outputs):
@@ -94,6 +94,25 @@ def test_bids_roundtrip(bids_validator_docker, bids_success_str, work_dir):
     assert dataset == reloaded
 
 
+def test_bids_create_id_prefixes(work_dir):
+
+    path = work_dir / "bids-dataset"
+    # IDs can be provided with or without the BIDS prefixes
+    BidsDataset.create(
+        path,
+        "bids-dataset",
+        subject_ids=["1", "sub-2"],
+        session_ids=["1", "ses-2"],
+    )
+    for subject_id in ("sub-1", "sub-2"):
+        assert sorted(p.name for p in (path / subject_id).iterdir()) == [
+            "ses-1",
+            "ses-2",
+        ]
+    assert not list(path.glob("sub-sub-*"))
+    assert not list(path.glob("*/ses-ses-*"))
+
+
 @dataclass
 class SourceNiftiXBlueprint:
     """The blueprint for the source nifti files"""
@@ -328,3 +347,23 @@ def test_run_bids_app_naked(
 
     for output in BIDS_OUTPUTS:
         assert Path(getattr(result.output, output.name)).exists()
+
+
+def test_build_bids_apps_on_same_dataset(work_dir: Path):
+
+    dataset = BidsDataset.create(
+        work_dir / "bids", "bids-dataset", subject_ids=["01"], session_ids=["01"]
+    )
+    # Building several apps (or the same one again) against the same dataset
+    # reuses the sinks added for their inputs
+    for app_name in (MOCK_BIDS_APP_NAME, MOCK_BIDS_APP_NAME + "2", MOCK_BIDS_APP_NAME):
+        bids_app(
+            name=app_name,
+            executable="/launch.sh",
+            inputs=BIDS_INPUTS,
+            outputs=BIDS_OUTPUTS,
+            dataset=dataset,
+        )
+    for inpt in BIDS_INPUTS:
+        assert dataset[inpt.name].path == inpt.path
+        assert dataset[inpt.name].format is inpt.format
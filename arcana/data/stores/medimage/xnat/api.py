@@ -4,7 +4,6 @@ import stat
 from pathlib import Path
 import typing as ty
 from glob import glob
-import time
 import tempfile
 import logging
 import errno
@@ -12,13 +11,19 @@ import json
 import re
 from zipfile import ZipFile, BadZipfile
 import shutil
+import threading
+import weakref
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import attrs
+from fasteners import InterProcessLock
 import xnat.session
 from arcana.core.utils import JSON_ENCODING
 from arcana.core.data.store import DataStore
 from arcana.core.data.row import DataRow
 from arcana.exceptions import ArcanaError, ArcanaUsageError, ArcanaWrongRepositoryError
-from arcana.core.utils import dir_modtime, parse_value
+from arcana.core.utils import parse_value, clone_or_copy
 from arcana.core.data.set import Dataset
 from arcana.core.utils import path2varname, varname2path, asdict
 from arcana.data.spaces.medimage import Clinical
@@ -29,10 +34,18 @@ logger = logging.getLogger("arcana")
 special_char_re = re.compile(r"[^a-zA-Z_0-9]")
 tag_parse_re = re.compile(r"\((\d+),(\d+)\)")
 
-RELEVANT_DICOM_TAG_TYPES = set(("UI", "CS", "DA", "TM", "SH", "LO", "PN", "ST", "AS"))
+RELEVANT_DICOM_TAG_TYPES = frozenset(
+    ("UI", "CS", "DA", "TM", "SH", "LO", "PN", "ST", "AS")
+)
 
 COMMAND_INPUT_TYPES = {bool: "bool", str: "string", int: "number", float: "number"}
 
+# Locks serialising downloads to the same cache path between the threads of this
+# process, which InterProcessLock doesn't exclude from each other. They are held
+# weakly so they are discarded once no thread is using them
+_download_thread_locks = weakref.WeakValueDictionary()
+_download_thread_locks_guard = threading.Lock()
+
 
 @attrs.define
 class Xnat(DataStore):
@@ -55,9 +68,9 @@ class Xnat(DataStore):
         Whether to check the MD5 digest of cached files before using. This
         checks for updates on the server since the file was cached
     race_condition_delay : int
-        The amount of time to wait before checking that the required
-        file_group has been downloaded to cache by another process has
-        completed if they are attempting to download the same file_group
+        The amount of time to wait for another process that is downloading the
+        same file_group to the cache to finish before logging that this process
+        is still waiting on it
     """
 
     server: str = attrs.field()
@@ -68,9 +81,16 @@ class Xnat(DataStore):
     race_condition_delay: int = attrs.field(default=30)
     _cached_datasets: ty.Dict[str, Dataset] = attrs.field(factory=dict, init=False)
     _login: xnat.session.XNATSession = attrs.field(default=None, init=False)
+    _xrow_cache: ty.Dict[tuple, ty.Any] = attrs.field(
+        factory=dict, init=False, repr=False, eq=False
+    )
+    _subject_labels: ty.Dict[str, str] = attrs.field(
+        factory=dict, init=False, repr=False, eq=False
+    )
 
     alias = "xnat"
     MD5_SUFFIX = ".md5.json"
+    LOCK_SUFFIX = ".lock"
     PROV_SUFFIX = ".__prov__.json"
     FIELD_PROV_RESOURCE = "__provenance__"
     depth = 2
@@ -156,6 +176,8 @@ class Xnat(DataStore):
     def disconnect(self):
         self.login.disconnect()
         self._login = None
+        self._xrow_cache.clear()  # XNAT objects are bound to the closed session
+        self._subject_labels.clear()
 
     def find_rows(self, dataset: Dataset, **kwargs):
         """
@@ -168,37 +190,75 @@ class Xnat(DataStore):
             The dataset to construct
         """
         with self:
-            # Get per_dataset level derivatives and fields
-            for exp in self.login.projects[dataset.id].experiments.values():
-                dataset.add_leaf([exp.subject.label, exp.label])
+            # List the subject and session labels of all experiments in a
+            # single request, instead of resolving the subject of each
+            # experiment object separately
+            for exp in self._list_experiments(dataset.id):
+                dataset.add_leaf([exp["subject_label"], exp["label"]])
+
+    def _list_experiments(self, project_id: str) -> ty.List[ty.Dict[str, str]]:
+        """Lists the experiments in an XNAT project along with the labels of
+        the subjects they belong to
+
+        Parameters
+        ----------
+        project_id : str
+            the ID of the project to list the experiments of
+
+        Returns
+        -------
+        list[dict[str, str]]
+            the 'ID', 'label' and 'subject_label' of each experiment
+        """
+        return self.login.get_json(
+            f"/data/projects/{project_id}/experiments",
+            query={"columns": "ID,label,subject_label"},
+        )["ResultSet"]["Result"]
 
     def find_items(self, row):
         with self:
             xrow = self.get_xrow(row)
-            # Add scans, fields and resources to data row
-            try:
-                xscans = xrow.scans
-            except AttributeError:
-                pass  # A subject or project row
-            else:
-                for xscan in xscans.values():
-                    row.add_file_group(
-                        path=xscan.type,
-                        order=xscan.id,
-                        quality=xscan.quality,
-                        # Ensure uri uses resource label instead of ID
-                        uris={
-                            r.label: "/".join(r.uri.split("/")[:-1] + [r.label])
-                            for r in xscan.resources.values()
-                        },
-                    )
-            for name, value in xrow.fields.items():
-                row.add_field(path=varname2path(name), value=value)
-            for xresource in xrow.resources.values():
-                row.add_file_group(
-                    path=varname2path(xresource.label),
-                    uris={xresource.format: xresource.uri},
-                )
+            # Retrieve the scans, fields and resources of the row in a single
+            # request instead of lazily loading each of the XnatPy collections
+            row_json = self.login.get_json(xrow.uri)["items"][0]
+            for child in row_json.get("children", []):
+                if child["field"] == "scans/scan":
+                    for scan_json in child["items"]:
+                        scan_fields = scan_json["data_fields"]
+                        scan_uri = xrow.uri + "/scans/" + scan_fields["ID"]
+                        row.add_file_group(
+                            path=scan_fields.get("type"),
+                            order=scan_fields["ID"],
+                            quality=scan_fields.get("quality"),
+                            # Ensure uri uses resource label instead of ID
+                            uris={
+                                r["data_fields"]["label"]: (
+                                    scan_uri + "/resources/" + r["data_fields"]["label"]
+                                )
+                                for c in scan_json.get("children", [])
+                                if c["field"] == "file"
+                                for r in c["items"]
+                            },
+                        )
+                elif child["field"] == "fields/field":
+                    for field_json in child["items"]:
+                        row.add_field(
+                            path=varname2path(field_json["data_fields"]["name"]),
+                            value=field_json["data_fields"].get("field"),
+                        )
+                elif child["field"] == "resources/resource":
+                    for resource_json in child["items"]:
+                        resource_fields = resource_json["data_fields"]
+                        row.add_file_group(
+                            path=varname2path(resource_fields["label"]),
+                            uris={
+                                resource_fields.get("format"): (
+                                    xrow.uri
+                                    + "/resources/"
+                                    + str(resource_fields["xnat_abstractresource_id"])
+                                )
+                            },
+                        )
 
     def get_file_group_paths(self, file_group):
         """
@@ -242,60 +302,98 @@ class Xnat(DataStore):
                 # cache name_path consistent
                 file_group.uri = base_uri + "/resources/" + xresource.label
             cache_path = self.cache_path(file_group)
-            need_to_download = True
-            if op.exists(cache_path):
-                if self.check_md5:
-                    md5_path = append_suffix(cache_path, self.MD5_SUFFIX)
-                    if md5_path.exists():
-                        with open(md5_path, "r") as f:
-                            cached_checksums = json.load(f)
-                    if cached_checksums == file_group.checksums:
-                        need_to_download = False
-                else:
-                    need_to_download = False
-            if need_to_download:
-                # The name_path to the directory which the files will be
-                # downloaded to.
-                tmp_dir = append_suffix(cache_path, ".download")
-                xresource = self.login.classes.Resource(
-                    uri=file_group.uri, xnat_session=self.login
-                )
-                try:
-                    # Attempt to make tmp download directory. This will
-                    # fail if another process (or previous attempt) has
-                    # already created it. In that case this process will
-                    # wait to see if that download finishes successfully,
-                    # and if so use the cached version.
-                    os.makedirs(tmp_dir)
-                except OSError as e:
-                    if e.errno == errno.EEXIST:
-                        # Another process may be concurrently downloading
-                        # the same file to the cache. Wait for
-                        # 'race_cond_delay' seconds and then check that it
-                        # has been completed or assume interrupted and
-                        # redownload.
-                        # TODO: This should really take into account the
-                        # size of the file being downloaded, and then the
-                        # user can estimate the download speed for their
-                        # store
-                        self._delayed_download(
-                            tmp_dir,
-                            xresource,
-                            file_group,
-                            cache_path,
-                            delay=self._race_cond_delay,
+            if not self._cache_valid(cache_path, file_group):
+                # Lock the cache path so that if another thread or process is
+                # concurrently downloading the same file group this one waits for
+                # it to finish and then uses the cached version instead of
+                # downloading it again
+                with self._download_lock(cache_path):
+                    if not self._cache_valid(cache_path, file_group):
+                        # The name_path to the directory which the files will be
+                        # downloaded to. Any existing directory is left over from
+                        # an interrupted download
+                        tmp_dir = append_suffix(cache_path, ".download")
+                        if tmp_dir.exists():
+                            shutil.rmtree(tmp_dir)
+                        os.makedirs(tmp_dir)
+                        xresource = self.login.classes.Resource(
+                            uri=file_group.uri, xnat_session=self.login
                         )
-                    else:
-                        raise
-                else:
-                    self.download_file_group(tmp_dir, xresource, file_group, cache_path)
-                    shutil.rmtree(tmp_dir)
+                        self.download_file_group(
+                            tmp_dir, xresource, file_group, cache_path
+                        )
+                        shutil.rmtree(tmp_dir)
         if file_group.is_dir:
             cache_paths = [cache_path]
         else:
-            cache_paths = list(cache_path.iterdir())
+            with os.scandir(cache_path) as entries:
+                cache_paths = [Path(e.path) for e in entries]
         return cache_paths
 
+    @contextmanager
+    def _download_lock(self, cache_path):
+        """Locks a cache path against concurrent downloads from both other threads
+        in this process and other processes, logging while waiting for them to
+        finish
+
+        Parameters
+        ----------
+        cache_path : Path
+            the path the file group is being downloaded to
+        """
+        with _download_thread_locks_guard:
+            thread_lock = _download_thread_locks.get(str(cache_path))
+            if thread_lock is None:
+                thread_lock = _download_thread_locks[str(cache_path)] = threading.Lock()
+        while not thread_lock.acquire(timeout=self.race_condition_delay):
+            logger.info(
+                "Waiting for download of '%s' initiated by another thread to finish",
+                cache_path,
+            )
+        try:
+            # fasteners' InterProcessLock only excludes other processes
+            process_lock = InterProcessLock(
+                str(cache_path) + self.LOCK_SUFFIX, logger=logger
+            )
+            while not process_lock.acquire(timeout=self.race_condition_delay):
+                logger.info(
+                    "Waiting for download of '%s' initiated by another process to "
+                    "finish",
+                    cache_path,
+                )
+            try:
+                yield
+            finally:
+                process_lock.release()
+        finally:
+            thread_lock.release()
+
+    def _cache_valid(self, cache_path, file_group):
+        """Checks whether the cached copy of a file group can be used, only
+        retrieving the checksums of the file group from the server if there is
+        a cached copy with an MD5 side-car to compare them against
+
+        Parameters
+        ----------
+        cache_path : Path
+            the path the file group is cached at
+        file_group : FileGroup
+            the file group to check the cache of
+
+        Returns
+        -------
+        bool
+            whether the cached copy is present and up-to-date
+        """
+        if not op.exists(cache_path):
+            return False
+        if not self.check_md5:
+            return True
+        md5_path = append_suffix(cache_path, self.MD5_SUFFIX)
+        if not md5_path.exists():
+            return False
+        return read_checksums(md5_path) == file_group.checksums
+
     def put_file_group_paths(self, file_group, fs_paths):
         """
         Stores files for a file group into the XNAT repository
@@ -341,29 +439,40 @@ class Xnat(DataStore):
             base_cache_path = self.cache_path(file_group)
             if base_cache_path.exists():
                 shutil.rmtree(base_cache_path)
-            # Upload data and add it to cache
-            cache_paths = []
-            for fs_path in fs_paths:
-                if fs_path.is_dir():
-                    # Upload directory to XNAT and add to cache
-                    for dpath, _, fnames in os.walk(fs_path):
-                        dpath = Path(dpath)
-                        for fname in fnames:
-                            fpath = dpath / fname
-                            frelpath = fpath.relative_to(fs_path)
-                            xresource.upload(str(fpath), str(frelpath))
-                    shutil.copytree(fs_path, base_cache_path)
-                    cache_path = base_cache_path
-                else:
-                    # Upload file path to XNAT and add to cache
-                    fname = file_group.copy_ext(fs_path, escaped_name)
-                    xresource.upload(str(fs_path), str(fname))
-                    base_cache_path.mkdir(
-                        exist_ok=True, parents=True, mode=stat.S_IRWXU | stat.S_IRWXG
-                    )
-                    cache_path = base_cache_path / fname
-                    shutil.copyfile(fs_path, cache_path)
-                cache_paths.append(cache_path)
+            # Upload data and add it to cache. The copies to the cache are made
+            # in a background thread so they overlap with the uploads
+            def cache_file(fs_path, cache_path):
+                cache_path.parent.mkdir(
+                    exist_ok=True, parents=True, mode=stat.S_IRWXU | stat.S_IRWXG
+                )
+                clone_or_copy(fs_path, cache_path)
+                return cache_path
+
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                cache_futures = []
+                for fs_path in fs_paths:
+                    if fs_path.is_dir():
+                        cache_futures.append(
+                            executor.submit(
+                                shutil.copytree,
+                                fs_path,
+                                base_cache_path,
+                                copy_function=clone_or_copy,
+                            )
+                        )
+                        # Upload directory to XNAT as a single (uncompressed) tar
+                        # archive that is extracted on the server, instead of
+                        # issuing a request per file
+                        xresource.upload_dir(fs_path, method="tar_file")
+                    else:
+                        fname = file_group.copy_ext(fs_path, escaped_name)
+                        cache_futures.append(
+                            executor.submit(
+                                cache_file, fs_path, base_cache_path / fname
+                            )
+                        )
+                        xresource.upload(str(fs_path), str(fname))
+                cache_paths = [Path(f.result()) for f in cache_futures]
             # need to manually set this here in order to calculate the
             # checksums (instead of waiting until after the 'put' is finished)
             file_group.set_fs_paths(cache_paths)
@@ -412,12 +521,14 @@ class Xnat(DataStore):
             the value to store
         """
         self._check_store(field)
+        # Encode arrays and strings as JSON so they are decoded by parse_value
+        # when the field is retrieved
         if field.array:
             if field.format is str:
-                value = ['"{}"'.format(v) for v in value]
-            value = "[" + ",".join(str(v) for v in value) + "]"
-        if field.format is str:
-            value = '"{}"'.format(value)
+                value = [str(v) for v in value]
+            value = json.dumps(list(value))
+        elif field.format is str:
+            value = json.dumps(str(value))
         with self:
             xsession = self.get_xrow(field.row)
             xsession.fields[path2varname(field)] = value
@@ -489,30 +600,38 @@ class Xnat(DataStore):
             response = self.login.get(
                 "/REST/services/dicomdump?src=" + scan_uri
             ).json()["ResultSet"]["Result"]
+        # Check the value representation before matching the tag so irrelevant
+        # tags skip the regex altogether
+        parse_tag = tag_parse_re.match
         hdr = {
-            tag_parse_re.match(t["tag1"]).groups(): convert(t["value"], t["vr"])
+            match.groups(): convert(t["value"], t["vr"])
             for t in response
-            if (tag_parse_re.match(t["tag1"]) and t["vr"] in RELEVANT_DICOM_TAG_TYPES)
+            if t["vr"] in RELEVANT_DICOM_TAG_TYPES and (match := parse_tag(t["tag1"]))
         }
         return hdr
 
     def download_file_group(self, tmp_dir, xresource, file_group, cache_path):
         # Download resource to zip file
         zip_path = op.join(tmp_dir, "download.zip")
-        with open(zip_path, "wb") as f:
+        expanded_dir = op.join(tmp_dir, "expanded")
+        # Retrieve the checksums from the server while the zip is streamed as
+        # the two requests are independent of each other
+        with ThreadPoolExecutor(max_workers=1) as executor, open(zip_path, "w+b") as f:
+            checksums_future = executor.submit(self.get_checksums, file_group)
             xresource.xnat_session.download_stream(
                 xresource.uri + "/files", f, format="zip", verbose=True
             )
-        checksums = self.get_checksums(file_group)
-        # Extract downloaded zip file
-        expanded_dir = op.join(tmp_dir, "expanded")
-        try:
-            with ZipFile(zip_path) as zip_file:
-                zip_file.extractall(expanded_dir)
-        except BadZipfile as e:
-            raise ArcanaError(
-                "Could not unzip file '{}' ({})".format(xresource.id, e)
-            ) from e
+            # Extract downloaded zip file from the handle it was written to
+            # instead of reopening it
+            f.seek(0)
+            try:
+                with ZipFile(f) as zip_file:
+                    zip_file.extractall(expanded_dir)
+            except BadZipfile as e:
+                raise ArcanaError(
+                    "Could not unzip file '{}' ({})".format(xresource.id, e)
+                ) from e
+            checksums = checksums_future.result()
         data_path = glob(expanded_dir + "/**/files", recursive=True)[0]
         # Remove existing cache if present
         try:
@@ -524,43 +643,6 @@ class Xnat(DataStore):
         with open(str(cache_path) + self.MD5_SUFFIX, "w", **JSON_ENCODING) as f:
             json.dump(checksums, f, indent=2)
 
-    def _delayed_download(self, tmp_dir, xresource, file_group, cache_path, delay):
-        logger.info(
-            "Waiting %s seconds for incomplete download of '%s' "
-            "initiated another process to finish",
-            delay,
-            cache_path,
-        )
-        initial_mod_time = dir_modtime(tmp_dir)
-        time.sleep(delay)
-        if op.exists(cache_path):
-            logger.info(
-                "The download of '%s' has completed "
-                "successfully in the other process, continuing",
-                cache_path,
-            )
-            return
-        elif initial_mod_time != dir_modtime(tmp_dir):
-            logger.info(
-                "The download of '%s' hasn't completed yet, but it has"
-                " been updated.  Waiting another %s seconds before "
-                "checking again.",
-                cache_path,
-                delay,
-            )
-            self._delayed_download(tmp_dir, xresource, file_group, cache_path, delay)
-        else:
-            logger.warning(
-                "The download of '%s' hasn't updated in %s "
-                "seconds, assuming that it was interrupted and "
-                "restarting download",
-                cache_path,
-                delay,
-            )
-            shutil.rmtree(tmp_dir)
-            os.mkdir(tmp_dir)
-            self.download_file_group(tmp_dir, xresource, file_group, cache_path)
-
     def get_xrow(self, row):
         """
         Returns the XNAT session and cache dir corresponding to the provided
@@ -571,7 +653,14 @@ class Xnat(DataStore):
         row : DataRow
             The row to get the corresponding XNAT row for
         """
+        # Resolved XNAT rows are reused for the lifetime of the connection to
+        # avoid looking up the project, subject and session for every item
+        key = (row.dataset.id, row.frequency, tuple(row.ids.items()))
         with self:
+            try:
+                return self._xrow_cache[key]
+            except KeyError:
+                pass
             xproject = self.login.projects[row.dataset.id]
             if row.frequency == Clinical.dataset:
                 xrow = xproject
@@ -583,6 +672,7 @@ class Xnat(DataStore):
                 xrow = self.login.classes.SubjectData(
                     label=self._make_row_name(row), parent=xproject
                 )
+            self._xrow_cache[key] = xrow
             return xrow
 
     def _make_row_name(self, row):
@@ -636,8 +726,7 @@ class Xnat(DataStore):
                 "{} is from {} instead of {}".format(item, item.dataset.store, self)
             )
 
-    @classmethod
-    def standard_uri(cls, xrow):
+    def standard_uri(self, xrow):
         """Get the URI of the XNAT row (ImageSession | Subject | Project)
         using labels rather than IDs for subject and sessions, e.g
 
@@ -656,7 +745,7 @@ class Xnat(DataStore):
         uri = xrow.uri
         if "experiments" in uri:
             # Replace ImageSession ID with label in URI.
-            uri = re.sub(r"(?<=/experiments/)[^/]+", xrow.label, uri)
+            uri = replace_uri_segment(uri, "/experiments/", xrow.label)
         if "subjects" in uri:
             try:
                 # If xrow is a ImageSession
@@ -666,13 +755,19 @@ class Xnat(DataStore):
                 subject_id = xrow.label
             except KeyError:
                 # There is a bug where the subject isn't appeared to be cached
-                # so we use this as a workaround
-                subject_json = xrow.xnat_session.get_json(
-                    xrow.uri.split("/experiments")[0]
-                )
-                subject_id = subject_json["items"][0]["data_fields"]["label"]
+                # so we use this as a workaround, remembering the label so it is
+                # only requested once per subject
+                subject_url = xrow.external_uri().split("/experiments")[0]
+                try:
+                    subject_id = self._subject_labels[subject_url]
+                except KeyError:
+                    subject_json = xrow.xnat_session.get_json(
+                        xrow.uri.split("/experiments")[0]
+                    )
+                    subject_id = subject_json["items"][0]["data_fields"]["label"]
+                    self._subject_labels[subject_url] = subject_id
             # Replace subject ID with subject label in URI
-            uri = re.sub(r"(?<=/subjects/)[^/]+", subject_id, uri)
+            uri = replace_uri_segment(uri, "/subjects/", subject_id)
         return uri
 
     def put_provenance(self, item, provenance: ty.Dict[str, ty.Any]):
@@ -729,3 +824,54 @@ class Xnat(DataStore):
 def append_suffix(path, suffix):
     "Appends a string suffix to a Path object"
     return Path(str(path) + suffix)
+
+
+def replace_uri_segment(uri, marker, replacement):
+    """Replaces the path segment following a marker in a URI, e.g. the ID after
+    '/experiments/', using plain string operations instead of a regex
+
+    Parameters
+    ----------
+    uri : str
+        the URI to replace the segment in
+    marker : str
+        the part of the URI that precedes the segment to replace
+    replacement : str
+        the value to replace the segment with
+
+    Returns
+    -------
+    str
+        the URI with the segment replaced
+    """
+    head, sep, rest = uri.partition(marker)
+    segment, slash, tail = rest.partition("/")
+    if not sep or not segment:
+        return uri
+    return head + sep + replacement + slash + tail
+
+
+def read_checksums(md5_path):
+    """Reads the checksums saved in an MD5 side-car file of a cached file group,
+    reusing the previously parsed checksums if the file hasn't changed since
+
+    Parameters
+    ----------
+    md5_path : Path
+        path to the side-car file
+
+    Returns
+    -------
+    dict[str, str]
+        the checksums of the files in the cached file group
+    """
+    md5_stat = os.stat(md5_path)
+    return _load_checksums(str(md5_path), md5_stat.st_mtime_ns, md5_stat.st_size)
+
+
+@lru_cache(maxsize=1024)
+def _load_checksums(md5_path: str, mtime_ns: int, size: int):
+    # The modification time and size are only included in the cache key so
+    # that modified side-cars are reloaded
+    with open(md5_path, "r") as f:
+        return json.load(f)
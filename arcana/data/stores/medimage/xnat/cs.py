@@ -41,9 +41,9 @@ class XnatViaCS(Xnat):
         Whether to check the MD5 digest of cached files before using. This
         checks for updates on the server since the file was cached
     race_cond_delay : int
-        The amount of time to wait before checking that the required
-        file_group has been downloaded to cache by another process has
-        completed if they are attempting to download the same file_group
+        The amount of time to wait for another process that is downloading the
+        same file_group to the cache to finish before logging that this process
+        is still waiting on it
     """
 
     INPUT_MOUNT = Path("/input")
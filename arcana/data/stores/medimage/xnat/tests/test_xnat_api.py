@@ -3,13 +3,18 @@ import sys
 import os.path
 import operator as op
 import shutil
+import threading
+import time
 import logging
 from pathlib import Path
 import hashlib
 from tempfile import mkdtemp
 from functools import reduce
+from unittest.mock import MagicMock, patch
 from arcana.data.spaces.medimage import Clinical
 from arcana.core.data.set import Dataset
+from arcana.data.stores.medimage import Xnat
+from arcana.data.stores.medimage.xnat.api import read_checksums, replace_uri_segment
 from arcana.test.datasets import create_test_file
 
 if sys.platform == "win32":
@@ -150,3 +155,165 @@ def test_put_items(mutable_xnat_dataset: Dataset, caplog):
         )
         mutable_xnat_dataset.refresh()
         check_inserted()
+
+
+def test_find_items_from_row_json(work_dir):
+    session_uri = "/data/experiments/EXP01"
+    row_json = {
+        "items": [
+            {
+                "children": [
+                    {
+                        "field": "scans/scan",
+                        "items": [
+                            {
+                                "data_fields": {
+                                    "ID": "1",
+                                    "type": "t1w",
+                                    "quality": "usable",
+                                },
+                                "children": [
+                                    {
+                                        "field": "file",
+                                        "items": [
+                                            {"data_fields": {"label": "NIFTI"}},
+                                            {"data_fields": {"label": "DICOM"}},
+                                        ],
+                                    }
+                                ],
+                            },
+                            # Scans without a type (or any resources)
+                            {"data_fields": {"ID": "2"}},
+                        ],
+                    },
+                    {
+                        "field": "fields/field",
+                        "items": [{"data_fields": {"name": "age", "field": "42"}}],
+                    },
+                    {
+                        "field": "resources/resource",
+                        "items": [
+                            {
+                                "data_fields": {
+                                    "label": "derived",
+                                    "format": "TEXT",
+                                    "xnat_abstractresource_id": 101,
+                                }
+                            }
+                        ],
+                    },
+                ]
+            }
+        ]
+    }
+    login = MagicMock()
+    login.get_json.return_value = row_json
+    row = MagicMock()
+    store = Xnat(server="https://xnat.example.org", cache_dir=work_dir)
+    with patch("xnat.connect", return_value=login), patch.object(
+        Xnat, "get_xrow", return_value=MagicMock(uri=session_uri)
+    ):
+        store.find_items(row)
+    login.get_json.assert_called_once_with(session_uri)
+    assert row.add_file_group.call_args_list[0].kwargs == {
+        "path": "t1w",
+        "order": "1",
+        "quality": "usable",
+        "uris": {
+            "NIFTI": session_uri + "/scans/1/resources/NIFTI",
+            "DICOM": session_uri + "/scans/1/resources/DICOM",
+        },
+    }
+    assert row.add_file_group.call_args_list[1].kwargs == {
+        "path": None,
+        "order": "2",
+        "quality": None,
+        "uris": {},
+    }
+    assert row.add_file_group.call_args_list[2].kwargs == {
+        "path": "derived",
+        "uris": {"TEXT": session_uri + "/resources/101"},
+    }
+    row.add_field.assert_called_once_with(path="age", value="42")
+
+
+def test_read_checksums_cache(work_dir):
+    md5_path = work_dir / "file_group.md5.json"
+    md5_path.write_text('{"file.txt": "aaaa"}')
+    os.utime(md5_path, ns=(1_000_000_000, 1_000_000_000))
+    checksums = read_checksums(md5_path)
+    assert checksums == {"file.txt": "aaaa"}
+    # Unchanged side-cars aren't parsed again
+    assert read_checksums(md5_path) is checksums
+    # Rewrite the side-car with contents of the same size so only the
+    # modification time differs
+    md5_path.write_text('{"file.txt": "bbbb"}')
+    os.utime(md5_path, ns=(2_000_000_000, 2_000_000_000))
+    assert read_checksums(md5_path) == {"file.txt": "bbbb"}
+
+
+def test_replace_uri_segment():
+    uri = "/data/projects/PROJ/subjects/XNAT_S01/experiments/XNAT_E01/scans/1"
+    assert (
+        replace_uri_segment(uri, "/experiments/", "SUBJ01_MR01")
+        == "/data/projects/PROJ/subjects/XNAT_S01/experiments/SUBJ01_MR01/scans/1"
+    )
+    assert (
+        replace_uri_segment(uri, "/subjects/", "SUBJ01")
+        == "/data/projects/PROJ/subjects/SUBJ01/experiments/XNAT_E01/scans/1"
+    )
+    # Segment at the end of the URI
+    assert (
+        replace_uri_segment("/data/experiments/XNAT_E01", "/experiments/", "MR01")
+        == "/data/experiments/MR01"
+    )
+    # URIs without the marker, or nothing after it, are returned unchanged
+    assert replace_uri_segment(uri, "/resources/", "X") == uri
+    assert replace_uri_segment("/data/experiments/", "/experiments/", "X") == (
+        "/data/experiments/"
+    )
+
+
+def test_concurrent_get_file_group_paths(work_dir):
+    cache_path = work_dir / "cache" / "file_group"
+    cache_path.parent.mkdir()
+    file_group = MagicMock(uri="/data/experiments/EXP01/resources/NIFTI", is_dir=True)
+    downloads = []
+    active = []
+
+    def mock_download(tmp_dir, xresource, file_group, cache_path):
+        active.append(tmp_dir)
+        downloads.append(len(active))
+        time.sleep(0.2)  # give the other thread the chance to interfere
+        assert tmp_dir.exists()
+        cache_path.mkdir()
+        active.remove(tmp_dir)
+
+    store = Xnat(server="https://xnat.example.org", cache_dir=work_dir)
+    with patch("xnat.connect", return_value=MagicMock()), patch.multiple(
+        Xnat,
+        _check_store=MagicMock(),
+        get_xrow=MagicMock(),
+        cache_path=MagicMock(return_value=cache_path),
+        _cache_valid=lambda self, cache_path, fg: cache_path.exists(),
+        download_file_group=lambda self, *args: mock_download(*args),
+    ):
+        results = []
+        # Hold the connection open across both threads, as is done when the
+        # store is used concurrently
+        with store:
+            threads = [
+                threading.Thread(
+                    target=lambda: results.append(
+                        store.get_file_group_paths(file_group)
+                    )
+                )
+                for _ in range(2)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+    # The file group is only downloaded once, and not by both threads at once
+    assert downloads == [1]
+    assert results == [[cache_path], [cache_path]]
@@ -173,3 +173,30 @@ def test_xnat_cs_pipeline(xnat_repository, run_spec, run_prefix, work_dir):
 
         for deriv in blueprint.derivatives:
             assert list(test_xsession.resources[deriv.name].files) == deriv.filenames
+
+
+def test_generate_xnat_cs_command_param_names():
+    xnat_command = generate_xnat_cs_command(
+        name="param-names-test",
+        pydra_task="arcana.test.tasks:concatenate",
+        image_tag="testorg/param-names-test:1.0",
+        inputs=[("in_file1", "scan1", "common:Text")],
+        outputs=[("out_file", "deriv/out", "common:Text")],
+        # Parameters given as strings name the Pydra field directly, whereas the
+        # Pydra field of ones given as dicts is derived from the escaped name
+        parameters=["a_b", {"name": "c_d"}],
+        description="Tests how parameter names are mapped onto Pydra fields",
+        version="1.0",
+        info_url="http://concatenate.readthefakedocs.io",
+        pkg_version="1.0",
+        wrapper_version="1",
+    )
+    param_inputs = {
+        i["name"]: i["replacement-key"]
+        for i in xnat_command["inputs"]
+        if i["replacement-key"].endswith("_PARAM]")
+    }
+    assert param_inputs == {"a_b": "[A_B_PARAM]", "c_d": "[C_U_D_PARAM]"}
+    cmdline = xnat_command["command-line"]
+    assert "--parameter a_b '[A_B_PARAM]'" in cmdline
+    assert "--parameter c_u_d '[C_U_D_PARAM]'" in cmdline
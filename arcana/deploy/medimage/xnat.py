@@ -1,3 +1,4 @@
+from __future__ import annotations
 import sys
 import re
 import typing as ty
@@ -5,9 +6,7 @@ from pathlib import Path
 import tempfile
 import inspect
 import json
-from copy import copy
 from dataclasses import dataclass
-from neurodocker.reproenv import DockerRenderer
 from arcana import __version__
 from arcana.core.data.format import FileGroup
 import arcana.data.formats.common
@@ -20,12 +19,16 @@ from arcana.core.utils import resolve_class, class_location, path2varname
 from arcana.core.data.store import DataStore
 from arcana.exceptions import ArcanaUsageError
 
+if ty.TYPE_CHECKING:
+    from neurodocker.reproenv import DockerRenderer
+
 
 def path2xnatname(path):
     return re.sub(r"[^a-zA-Z0-9_]+", "_", path)
 
 
 IN_DOCKER_ARCANA_HOME_DIR = "/arcana-home"
+XNAT_CS_STORE_CLASS = "<" + class_location(XnatViaCS) + ">"
 
 
 def build_xnat_cs_image(
@@ -37,6 +40,7 @@ def build_xnat_cs_image(
     build_dir: Path = None,
     test_config: bool = False,
     generate_only: bool = False,
+    cache_from: ty.Iterable[str] = (),
     pkg_version: str = None,  # Ignored here, just included to allow specs to be passed directly as kwargs
     wrapper_version: str = None,  # ditto
     **kwargs,
@@ -67,6 +71,8 @@ def build_xnat_cs_image(
     test_config : bool
         whether to create the container so that it will work with the test
         XNAT configuration (i.e. hard-coding the XNAT server IP)
+    cache_from : Iterable[str], optional
+        images to pull and use as layer-cache sources when building the image
     pkg_version : str, optional
         ignored by function, just included to allow specs to be passed directly
         as kwargs **specs
@@ -89,6 +95,7 @@ def build_xnat_cs_image(
         "kwargs",
         "build_dir",
         "generate_only",
+        "cache_from",
         "license_dir",
         "pkg_version",
         "wrapper_version",
@@ -105,24 +112,21 @@ def build_xnat_cs_image(
 
     xnat_commands = []
     for cmd_spec in commands:
-
-        if "info_url" not in cmd_spec:
-            cmd_spec = copy(cmd_spec)
-            cmd_spec["info_url"] = info_url
-
         xnat_cmd = generate_xnat_cs_command(
             image_tag=image_tag,
             registry=docker_registry,
             pkg_version=pkg_version,
             wrapper_version=wrapper_version,
-            **cmd_spec,
+            # Default to the package info URL if not provided by the command spec
+            **{"info_url": info_url, **cmd_spec},
         )
 
         xnat_commands.append(xnat_cmd)
 
     # Convert XNAT command label into string that can by placed inside the
-    # Docker label
-    command_label = json.dumps(xnat_commands).replace("$", r"\$")
+    # Docker label. Compact separators keep the (potentially large) label, and
+    # the string-escaping pass over it when it is quoted in the Dockerfile, small
+    command_label = json.dumps(xnat_commands, separators=(",", ":")).replace("$", r"\$")
 
     dockerfile = construct_dockerfile(
         build_dir,
@@ -137,7 +141,7 @@ def build_xnat_cs_image(
     save_store_config(dockerfile, build_dir, test_config=test_config)
 
     if not generate_only:
-        dockerfile_build(dockerfile, build_dir, image_tag)
+        dockerfile_build(dockerfile, build_dir, image_tag, cache_from=cache_from)
 
     return dockerfile, build_dir
 
@@ -255,13 +259,16 @@ def generate_xnat_cs_command(
         if isinstance(param, ParamArg):
             parsed = param
         elif isinstance(param, str):
-            parsed = ParamArg(pydra_field=param)
+            # Plain strings are the name of the Pydra field, which is used as is
+            # instead of being escaped with path2varname
+            parsed = ParamArg(name=param, pydra_field=param)
         else:
             parsed = ParamArg(**param)
         parsed_params.append(parsed)
     parameters = parsed_params
 
     # JSON to define all inputs and parameters to the pipelines
+    command_input_type = COMMAND_INPUT_TYPES.get  # bound once for the loops below
     inputs_json = []
 
     # Add task inputs to inputs JSON specification
@@ -275,7 +282,7 @@ def generate_xnat_cs_command(
             desc = (
                 f"Match field ({inpt.format.dtype}) [FIELD_NAME]: {inpt.description} "
             )
-            input_type = COMMAND_INPUT_TYPES.get(inpt.format, "string")
+            input_type = command_input_type(inpt.format, "string")
         inputs_json.append(
             {
                 "name": path2xnatname(inpt.name),
@@ -302,7 +309,7 @@ def generate_xnat_cs_command(
             {
                 "name": param.name,
                 "description": desc,
-                "type": COMMAND_INPUT_TYPES.get(param.type, "string"),
+                "type": command_input_type(param.type, "string"),
                 "default-value": (param.default if param.default else ""),
                 "required": param.required,
                 "user-settable": True,
@@ -316,13 +323,17 @@ def generate_xnat_cs_command(
     output_handlers = []
     output_args = []
     for output in outputs:
-        label = output.path.split("/")[0]
-        out_fname = output.path + ("." + output.format.ext if output.format.ext else "")
+        output_name = output.name
+        path = output.path
+        ext = output.format.ext
+        format_location = output.format.location()
+        label = path.split("/")[0]
+        out_fname = path + ("." + ext if ext else "")
         # Set the path to the
         outputs_json.append(
             {
-                "name": output.name,
-                "description": f"{output.pydra_field} ({output.format.location()})",
+                "name": output_name,
+                "description": f"{output.pydra_field} ({format_location})",
                 "required": True,
                 "mount": "out",
                 "path": out_fname,
@@ -331,8 +342,8 @@ def generate_xnat_cs_command(
         )
         output_handlers.append(
             {
-                "name": f"{output.name}-resource",
-                "accepts-command-output": output.name,
+                "name": f"{output_name}-resource",
+                "accepts-command-output": output_name,
                 "via-wrapup-command": None,
                 "as-a-child-of": "SESSION",
                 "type": "Resource",
@@ -341,7 +352,7 @@ def generate_xnat_cs_command(
             }
         )
         output_args.append(
-            f"--output {output.name} {output.stored_format.location()} '{output.path}' {output.pydra_field} {output.format.location()} "
+            f"--output {output_name} {output.stored_format.location()} '{path}' {output.pydra_field} {format_location} "
         )
 
     # Set up fixed arguments used to configure the workflow at initialisation
@@ -378,14 +389,10 @@ def generate_xnat_cs_command(
     cmdline = (
         f"conda run --no-capture-output -n {CONDA_ENV} "  # activate conda
         f"run-arcana-pipeline xnat-cs//[PROJECT_ID] {name} {pydra_task} "  # run pydra task in Arcana
-        + input_args_str
-        + output_args_str
-        + param_args_str
-        + config_args_str
-        + FLAGS_KEY
-        + " "
-        + f"--dataset-space medimage:Clinical "
-        f"--dataset-hierarchy subject,session "
+        f"{input_args_str}{output_args_str}{param_args_str}{config_args_str}"
+        f"{FLAGS_KEY} "
+        "--dataset-space medimage:Clinical "
+        "--dataset-hierarchy subject,session "
         "--single-row [SUBJECT_LABEL],[SESSION_LABEL] "
         f"--row-frequency {row_frequency} "
     )  # pass XNAT API details
@@ -411,73 +418,13 @@ def generate_xnat_cs_command(
         # Create Session input that  can be passed to the command line, which
         # will be populated by inputs derived from the XNAT session object
         # passed to the pipeline.
-        inputs_json.extend(
-            [
-                {
-                    "name": "SESSION_LABEL",
-                    "description": "Imaging session label",
-                    "type": "string",
-                    "required": True,
-                    "user-settable": False,
-                    "replacement-key": "[SESSION_LABEL]",
-                },
-                {
-                    "name": "SUBJECT_LABEL",
-                    "description": "Subject label",
-                    "type": "string",
-                    "required": True,
-                    "user-settable": False,
-                    "replacement-key": "[SUBJECT_LABEL]",
-                },
-            ]
-        )
+        inputs_json.extend(dict(i) for i in SESSION_INPUTS)
         # Add specific session to process to command line args
         cmdline += " --ids [SESSION_LABEL] "
         # Access the session XNAT object passed to the pipeline
-        external_inputs = [
-            {
-                "name": "SESSION",
-                "description": "Imaging session",
-                "type": "Session",
-                "source": None,
-                "default-value": None,
-                "required": True,
-                "replacement-key": None,
-                "sensitive": None,
-                "provides-value-for-command-input": None,
-                "provides-files-for-command-mount": "in",
-                "via-setup-command": None,
-                "user-settable": False,
-                "load-children": True,
-            }
-        ]
+        external_inputs = [dict(i) for i in SESSION_EXTERNAL_INPUTS]
         # Access to project ID and session label from session XNAT object
-        derived_inputs = [
-            {
-                "name": "__SESSION_LABEL__",
-                "type": "string",
-                "derived-from-wrapper-input": "SESSION",
-                "derived-from-xnat-object-property": "label",
-                "provides-value-for-command-input": "SESSION_LABEL",
-                "user-settable": False,
-            },
-            {
-                "name": "__SUBJECT_ID__",
-                "type": "string",
-                "derived-from-wrapper-input": "SESSION",
-                "derived-from-xnat-object-property": "subject-id",
-                "provides-value-for-command-input": "SUBJECT_LABEL",
-                "user-settable": False,
-            },
-            {
-                "name": "__PROJECT_ID__",
-                "type": "string",
-                "derived-from-wrapper-input": "SESSION",
-                "derived-from-xnat-object-property": "project-id",
-                "provides-value-for-command-input": "PROJECT_ID",
-                "user-settable": False,
-            },
-        ]
+        derived_inputs = [dict(i) for i in SESSION_DERIVED_INPUTS]
 
     else:
         raise NotImplementedError(
@@ -496,15 +443,7 @@ def generate_xnat_cs_command(
         "type": "docker",
         "command-line": cmdline,
         "override-entrypoint": True,
-        "mounts": [
-            {"name": "in", "writable": False, "path": str(XnatViaCS.INPUT_MOUNT)},
-            {"name": "out", "writable": True, "path": str(XnatViaCS.OUTPUT_MOUNT)},
-            {  # Saves the Pydra-cache directory outside of the container for easier debugging
-                "name": "work",
-                "writable": True,
-                "path": str(XnatViaCS.WORK_MOUNT),
-            },
-        ],
+        "mounts": [dict(m) for m in XNAT_CS_MOUNTS],
         "ports": {},
         "inputs": inputs_json,
         "outputs": outputs_json,
@@ -544,8 +483,7 @@ def copy_command_ref(dockerfile: DockerRenderer, xnat_commands, build_dir):
     cmds_dir.mkdir(exist_ok=True)
     for cmd in xnat_commands:
         fname = cmd.get("name", "command") + ".json"
-        with open(cmds_dir / fname, "w") as f:
-            json.dump(cmd, f, indent="    ")
+        (cmds_dir / fname).write_text(json.dumps(cmd, indent="    "))
     dockerfile.copy(source=["./xnat_commands"], destination="/xnat_commands")
 
 
@@ -563,7 +501,7 @@ def save_store_config(dockerfile: DockerRenderer, build_dir: Path, test_config=F
         case the server location will be hard-coded rather than rely on the
         XNAT_HOST environment variable passed to the container by the XNAT CS
     """
-    xnat_cs_store_entry = {"class": "<" + class_location(XnatViaCS) + ">"}
+    xnat_cs_store_entry = {"class": XNAT_CS_STORE_CLASS}
     if test_config:
         if sys.platform == "linux":
             ip_address = "172.17.0.1"  # Linux + GH Actions
@@ -573,8 +511,7 @@ def save_store_config(dockerfile: DockerRenderer, build_dir: Path, test_config=F
     DataStore.save_entries(
         {"xnat-cs": xnat_cs_store_entry}, config_path=build_dir / "stores.yaml"
     )
-    dockerfile.run(command="mkdir -p /root/.arcana")
-    dockerfile.run(command=f"mkdir -p {str(XnatViaCS.CACHE_DIR)}")
+    dockerfile.run(command=f"mkdir -p /root/.arcana {str(XnatViaCS.CACHE_DIR)}")
     dockerfile.copy(
         source=["./stores.yaml"], destination=IN_DOCKER_ARCANA_HOME_DIR + "/stores.yaml"
     )
@@ -589,8 +526,7 @@ def create_metapackage(image_tag, manifest, use_local_packages=False):
         build_dir=build_dir, use_local_packages=use_local_packages
     )
 
-    with open(build_dir / "manifest.json", "w") as f:
-        json.dump(manifest, f)
+    (build_dir / "manifest.json").write_text(json.dumps(manifest))
 
     dockerfile.copy(["./manifest.json"], "/manifest.json")
 
@@ -682,3 +618,84 @@ COMMAND_INPUT_TYPES = {bool: "bool", str: "string", int: "number", float: "numbe
 
 
 VALID_FREQUENCIES = (Clinical.session, Clinical.dataset)
+
+# Static parts of the XNAT command JSON, which are copied into each generated
+# command so they don't need to be rebuilt on every call
+
+XNAT_CS_MOUNTS = (
+    {"name": "in", "writable": False, "path": str(XnatViaCS.INPUT_MOUNT)},
+    {"name": "out", "writable": True, "path": str(XnatViaCS.OUTPUT_MOUNT)},
+    {  # Saves the Pydra-cache directory outside of the container for easier debugging
+        "name": "work",
+        "writable": True,
+        "path": str(XnatViaCS.WORK_MOUNT),
+    },
+)
+
+# Session inputs that can be passed to the command line, which will be populated
+# by inputs derived from the XNAT session object passed to the pipeline
+SESSION_INPUTS = (
+    {
+        "name": "SESSION_LABEL",
+        "description": "Imaging session label",
+        "type": "string",
+        "required": True,
+        "user-settable": False,
+        "replacement-key": "[SESSION_LABEL]",
+    },
+    {
+        "name": "SUBJECT_LABEL",
+        "description": "Subject label",
+        "type": "string",
+        "required": True,
+        "user-settable": False,
+        "replacement-key": "[SUBJECT_LABEL]",
+    },
+)
+
+# The session XNAT object passed to the pipeline
+SESSION_EXTERNAL_INPUTS = (
+    {
+        "name": "SESSION",
+        "description": "Imaging session",
+        "type": "Session",
+        "source": None,
+        "default-value": None,
+        "required": True,
+        "replacement-key": None,
+        "sensitive": None,
+        "provides-value-for-command-input": None,
+        "provides-files-for-command-mount": "in",
+        "via-setup-command": None,
+        "user-settable": False,
+        "load-children": True,
+    },
+)
+
+# Project ID and session/subject labels derived from the session XNAT object
+SESSION_DERIVED_INPUTS = (
+    {
+        "name": "__SESSION_LABEL__",
+        "type": "string",
+        "derived-from-wrapper-input": "SESSION",
+        "derived-from-xnat-object-property": "label",
+        "provides-value-for-command-input": "SESSION_LABEL",
+        "user-settable": False,
+    },
+    {
+        "name": "__SUBJECT_ID__",
+        "type": "string",
+        "derived-from-wrapper-input": "SESSION",
+        "derived-from-xnat-object-property": "subject-id",
+        "provides-value-for-command-input": "SUBJECT_LABEL",
+        "user-settable": False,
+    },
+    {
+        "name": "__PROJECT_ID__",
+        "type": "string",
+        "derived-from-wrapper-input": "SESSION",
+        "derived-from-xnat-object-property": "project-id",
+        "provides-value-for-command-input": "PROJECT_ID",
+        "user-settable": False,
+    },
+)
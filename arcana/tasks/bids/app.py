@@ -18,11 +18,12 @@ from pydra.engine.specs import (
     ShellOutSpec,
 )
 from arcana.core.data.set import Dataset
+from arcana.core.data.column import DataSink
 from arcana.data.spaces.medimage import Clinical
 from arcana.data.stores.bids.structure import JsonEdit
 from arcana.data.stores.bids.dataset import BidsDataset
 from arcana.exceptions import ArcanaUsageError
-from arcana.core.utils import func_task, path2varname, resolve_class
+from arcana.core.utils import func_task, path2varname, resolve_class, clone_or_copy
 
 logger = logging.getLogger("arcana")
 
@@ -159,6 +160,22 @@ def bids_app(
     inputs = [Input.fromdict(i) if not isinstance(i, Input) else i for i in inputs]
     outputs = [Output.fromdict(o) if not isinstance(o, Output) else o for o in outputs]
 
+    # Add the sinks for the inputs to the dataset once here, rather than each time
+    # the 'to_bids' task is run. NB: the output sinks are added in 'extract_bids' as
+    # they can't be present while the inputs are written (JSON edits are resolved
+    # against the paths of all items in the row)
+    for inpt in inputs:
+        sink = dataset.columns.get(inpt.name)
+        # Reuse identical sinks added by other apps built against the same dataset
+        # (or previous builds of this one)
+        if not (
+            isinstance(sink, DataSink)
+            and sink.path == inpt.path
+            and sink.format is inpt.format
+            and sink.row_frequency == dataset.leaf_freq
+        ):
+            dataset.add_sink(inpt.name, inpt.format, path=inpt.path)
+
     # Ensure output paths all start with 'derivatives
     input_names = [i.name for i in inputs]
     output_names = [o.name for o in outputs]
@@ -178,7 +195,6 @@ def bids_app(
             in_fields=(
                 [
                     ("row_frequency", Clinical),
-                    ("inputs", ty.List[ty.Tuple[str, type, str]]),
                     ("dataset", Dataset or str),
                     ("id", str),
                     ("json_edits", str),
@@ -192,7 +208,6 @@ def bids_app(
             ],
             name="to_bids",
             row_frequency=row_frequency,
-            inputs=inputs,
             dataset=dataset,
             id=wf.bidsify_id.lzout.out,
             json_edits=wf.lzin.json_edits,
@@ -315,6 +330,8 @@ CONTAINER_DATASET_PATH = "/arcana_bids_dataset"
 
 DEFAULT_BIDS_ID = "sub-DEFAULT"
 
+non_alphanumeric_re = re.compile(r"[^a-zA-Z0-9]")
+
 
 @mark.task
 @mark.annotate({"return": {"out": str, "no_prefix": str}})
@@ -322,23 +339,20 @@ def bidsify_id(id):
     if id == attrs.NOTHING:
         id = DEFAULT_BIDS_ID
     else:
-        id = re.sub(r"[^a-zA-Z0-9]", "", id)
+        id = non_alphanumeric_re.sub("", id)
         if not id.startswith("sub-"):
             id = "sub-" + id
     return id, id[len("sub-") :]
 
 
-def to_bids(
-    row_frequency, inputs, dataset, id, json_edits, fixed_json_edits, **input_values
-):
-    """Takes generic inptus and stores them within a BIDS dataset"""
+def to_bids(row_frequency, dataset, id, json_edits, fixed_json_edits, **input_values):
+    """Takes generic inptus and stores them within a BIDS dataset. The sinks for the
+    inputs are expected to have already been added to the dataset"""
     # Update the Bids store with the JSON edits requested by the user
     je_args = shlex.split(json_edits) if json_edits else []
     dataset.store.json_edits = JsonEdit.attr_converter(
         fixed_json_edits + list(zip(je_args[::2], je_args[1::2]))
     )
-    for inpt in inputs:
-        dataset.add_sink(inpt.name, inpt.format, path=inpt.path)
     row = dataset.row(row_frequency, id)
     with dataset.store:
         for inpt_name, inpt_value in input_values.items():
@@ -376,7 +390,11 @@ def extract_bids(
         'extract_bids' is run after the app has completed.
     """
     # Copy output dir into BIDS dataset
-    shutil.copytree(output_dir, Path(dataset.id) / "derivatives" / app_name / id)
+    shutil.copytree(
+        output_dir,
+        Path(dataset.id) / "derivatives" / app_name / id,
+        copy_function=clone_or_copy,
+    )
     output_paths = []
     row = dataset.row(row_frequency, id)
     for output in outputs: